@@ -3,26 +3,37 @@ from pathlib import Path
 import logging
 
 # from flask import Flask
-import pandas as pd
+from flask import jsonify
 from dash import Dash, dcc, html, Input, Output, State, dash_table#, callback
 import dash_bootstrap_components as dbc
 
-from .src.data.import_data_pks import hierarchize_data
+from .src.data.import_data_pks import build_startup
+from .src.data.dataset import read_processed, read_keys, read_version
+from .src.data.engine import make_engine
+from .src.data.snapshot import has_snapshot, read_snapshot_bund
+from .src.data.startup import has_startup, read_startup
 from .src.visualization.visualize import (
     empty_plot,
     sunburst_location,
-    get_sunburst,
     get_presence_chart,
     get_ts_clearance,
     get_ts_states,
     color_map_from_color_column,
+    presence_lookup,
 )
+from .src.visualization.figure_cache import FigureCache
 
 # import from config relatively, so it remains portable:
 dashapp_rootdir = Path(__file__).resolve().parents[1]
 sys.path.append(str(dashapp_rootdir))
 
-from .config import MAXKEYS
+from .config import (
+    MAXKEYS,
+    ENGINE,
+    FIGURE_CACHE_BYTES,
+    FIGURE_CACHE_DB,
+    FIGURE_CACHE_DB_BYTES,
+)
 
 logging.basicConfig(
     filename="logs/pks_app.log",
@@ -42,26 +53,39 @@ def init_dashboard(flask_app, route):
         external_stylesheets=[dbc.themes.FLATLY],
     )
 
-    data_raw = pd.read_parquet(dashapp_rootdir / "data" / "processed" / "pks.parquet")
-    data_bund = data_raw.loc[data_raw.state == "Bund"]
-
-    # infer key hierarchy from key numbers:
-    data_bund = hierarchize_data(data_bund)
-
-    # catalog is used for the key picker and table:
-    catalog = data_bund[["key", "label", "parent", "sectionwidth"]].drop_duplicates(
-        subset="key"
-    )
-    catalog.label = catalog.label.str.replace("<br>", " ")
-    catalog["label_key"] = catalog.apply(
-        lambda row: row.label + " (" + row.key + ")", axis=1
-    )
-
-    # initial sunburst plot:
-    sunburst = get_sunburst(
-        catalog,
-        colormap=color_map_from_color_column(data_bund),
-    )
+    # the federal level is kept in memory as a frame (labels and all) for the
+    # sunburst and the catalog; callbacks get their rows from the query engine
+    # (config.ENGINE):
+    processed_path = dashapp_rootdir / "data" / "processed" / "pks"
+
+    # the version (content hash) of the dataset, for caches and clients; every
+    # response of the server carries it in a header:
+    app.dataset_version = read_version(processed_path)["version"]
+    logging.info(f"Serving dataset version {app.dataset_version}.")
+
+    @app.server.after_request
+    def add_dataset_version(response):
+        response.headers["X-PKS-Dataset-Version"] = app.dataset_version
+        return response
+
+    if has_snapshot(processed_path):
+        # memory-mapped and shared with the other workers:
+        data_bund = read_snapshot_bund(processed_path)
+    else:
+        logging.info("No snapshot of the dataset, reading it from parquet (see 'make snapshot').")
+        data_bund = read_processed(processed_path, states=["Bund"])
+
+    # catalog is used for the key picker and table, the hierarchy for the
+    # sunburst and the key picker; all three are built by the import and kept
+    # with the dataset:
+    if has_startup(processed_path):
+        catalog, hierarchy, sunburst = read_startup(processed_path)
+    else:
+        logging.info("No startup files for the dataset, inferring the key hierarchy.")
+        catalog, hierarchy, sunburst = build_startup(data_bund)
+
+    engine = make_engine(ENGINE, data_bund, processed_path)
+    logging.info(f"Serving callbacks with the {engine.name} engine.")
 
     #          define dash elements outside the layout for legibility:
     # -----------------------------------------------------------------------------
@@ -283,12 +307,32 @@ def init_dashboard(flask_app, route):
         ]
     )
 
-    init_callbacks(app, data_bund, data_raw)
+    # key colors and the series of every key in the presence chart, built once:
+    presence = presence_lookup(data_bund, colormap=color_map_from_color_column(data_bund))
+
+    # rendered figures, by dataset version and selection; counters at
+    # <route>_figure-cache:
+    figure_cache = FigureCache(
+        app.dataset_version,
+        max_bytes=FIGURE_CACHE_BYTES,
+        db_path=dashapp_rootdir / FIGURE_CACHE_DB if FIGURE_CACHE_DB else None,
+        max_db_bytes=FIGURE_CACHE_DB_BYTES,
+    )
+
+    @app.server.route(f"{route}_figure-cache")
+    def figure_cache_stats():
+        return jsonify(figure_cache.stats())
+
+    init_callbacks(app, engine, processed_path, hierarchy, presence, figure_cache)
 
     return app#.server
 
 
-def init_callbacks(app, data_bund, data_raw):
+def init_callbacks(app, engine, processed_path, hierarchy, presence, figure_cache):
+
+    # per-key freq ranges over all states, for the axes of the state
+    # timeseries:
+    key_stats = read_keys(processed_path).set_index("key")[["freq_min", "freq_max"]]
 
     # DEBUG: display sunburst clickdata:
     # @app.callback(
@@ -316,9 +360,9 @@ def init_callbacks(app, data_bund, data_raw):
             if (
                 key == "root" or key is None
             ):  # just special syntax for when parent is None
-                child_keys = data_bund.loc[data_bund.parent.eq("------")].key.unique()
+                child_keys = hierarchy.children("------")
             else:
-                child_keys = data_bund.loc[data_bund.parent == key].key.unique()
+                child_keys = hierarchy.children(key)
             selected_keys = child_keys
 
         elif active_tab == "textsearch":
@@ -326,9 +370,12 @@ def init_callbacks(app, data_bund, data_raw):
             for element in table_data:
                 selected_keys.append(element["key"])
 
-        colormap = {k: grp.color.iloc[0] for k, grp in data_bund.groupby("key")}
-
-        fig = get_presence_chart(data_bund, selected_keys, colormap)
+        # the chart depends on the selected keys only, not on their order:
+        fig = figure_cache.get(
+            "presence",
+            sorted(map(str, selected_keys)),
+            lambda: get_presence_chart(presence, selected_keys),
+        )
 
         return fig
 
@@ -395,35 +442,13 @@ def init_callbacks(app, data_bund, data_raw):
             )
 
         # filter on selected keys:
-        df_ts = data_bund.loc[data_bund.key.isin(keylist)].reset_index()
-
-        # remove years in which cases = 0 (prevent div/0):
-        df_ts = df_ts.loc[df_ts["count"].gt(0)]
-
-        # prepare transformed columns for bar display:
-        df_ts["unsolved"] = df_ts["count"] - df_ts.clearance
-        df_ts["clearance_rate"] = df_ts.apply(
-            lambda r: round(r["clearance"] / r["count"] * 100, 1), axis=1
+        # years without cases are left out (no clearance rate):
+        fig = figure_cache.get(
+            "clearance",
+            sorted(set(keylist)),
+            lambda: get_ts_clearance(engine.federal(keylist, min_count=1)),
         )
 
-        # prepare long shape for consumption by plotting function:
-        df_ts = pd.melt(
-            df_ts,
-            id_vars=[
-                "key",
-                "state",
-                "year",
-                "shortlabel",
-                "label",
-                "color",
-                "clearance_rate",
-                "count",
-            ],
-            value_vars=["clearance", "unsolved"],
-        )
-
-        fig = get_ts_clearance(df_ts)
-
         return fig
 
     # Update state timeseries from keystore
@@ -441,9 +466,11 @@ def init_callbacks(app, data_bund, data_raw):
                 "Schlüssel/Delikte auswählen, um hier<br>den Ländervergleich zu sehen!"
             )
 
-        # filter on selected keys:
-        df_ts = data_raw.loc[data_raw.key.isin(keylist)].reset_index()
-
-        fig = get_ts_states(df_ts)
+        # the selected keys of all states:
+        fig = figure_cache.get(
+            "states",
+            sorted(set(keylist)),
+            lambda: get_ts_states(engine.states(keylist, measures=["freq"]), key_stats),
+        )
 
         return fig
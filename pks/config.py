@@ -1,2 +1,19 @@
+import os
+
 # Darstellung: Wie viele Schlüssel werden max. in der Zeitreihe angezeigt?
 MAXKEYS = 4
+
+# Abfragen der Callbacks: "pandas" (Schlüsselindex und Datenwürfel) oder
+# "arrow" (pyarrow-Tabelle mit pyarrow.compute); je Installation über die
+# Umgebungsvariable PKS_ENGINE wählbar. Nur mit "arrow" teilen sich alle
+# Prozesse eines Rechners die Daten aus dem Snapshot (siehe snapshot.py); mit
+# "pandas" baut jeder Prozess seinen eigenen Datenwürfel.
+ENGINE = os.environ.get("PKS_ENGINE", "pandas")
+
+# Zwischenspeicher für fertige Abbildungen der Callbacks: Obergrenze im
+# Speicher je Prozess (in Bytes) und optional eine SQLite-Datei, die sich alle
+# Prozesse eines Rechners teilen (relativ zum Projektordner, z.B.
+# data/interim/figures.sqlite), mit eigener Obergrenze.
+FIGURE_CACHE_BYTES = int(os.environ.get("PKS_FIGURE_CACHE_BYTES", 64 * 2**20))
+FIGURE_CACHE_DB = os.environ.get("PKS_FIGURE_CACHE_DB")
+FIGURE_CACHE_DB_BYTES = int(os.environ.get("PKS_FIGURE_CACHE_DB_BYTES", 512 * 2**20))
@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from ..data.import_data_pks import (
+    import_data,
+    clean_labels,
+    mark_labelchange,
+    hierarchize_data,
+    _clean_label,
+)
+from ..data.dataset import read_districts
+from ..data.import_districts import import_districts, build_districts
+from ..data.synthetic import (
+    synthetic_frame,
+    write_workbooks,
+    synthetic_district_frame,
+    write_district_workbooks,
+)
+from ..visualization.visualize import make_df_colormap, wrap_label
+
+
+def _clear_caches():
+    """
+    Forget memoized labels, so that every run starts cold.
+    """
+    _clean_label.cache_clear()
+    wrap_label.cache_clear()
+
+
+def _cpu_seconds() -> float:
+    # user and system time of this process and of its finished child processes
+    # (e.g. the import workers, which are joined before the import returns):
+    return sum(os.times()[:4])
+
+
+def _measure(func, repeat: int) -> dict:
+    """
+    Time func (fresh caches, best and all of repeat runs; CPU time including
+    worker processes), then run it once more under tracemalloc for its peak
+    memory (Python and NumPy allocations; not those of worker processes).
+    """
+    runs = []
+    for _ in range(repeat):
+        _clear_caches()
+        wall, cpu = time.perf_counter(), _cpu_seconds()
+        result = func()
+        runs.append((time.perf_counter() - wall, _cpu_seconds() - cpu))
+
+    _clear_caches()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, {
+        "seconds": min(wall for wall, _ in runs),
+        "cpu_seconds": min(cpu for _, cpu in runs),
+        "runs": [wall for wall, _ in runs],
+        "peak_mb": peak / 2**20,
+    }
+
+
+def run_benchmark(n_years: int = 11, n_keys: int = 1200, n_states: int = 17,
+                  label_change_rate: float = 0.05, excel: bool = False, jobs: int = 1,
+                  repeat: int = 3, seed: int = 0, districts: int = 0) -> dict:
+    """
+    Benchmark the import stages on synthetic PKS data of the given size.
+
+    :param excel: also benchmark import_data() on synthetic Excel files
+    :param jobs: processes for import_data()
+    :param repeat: timed runs per stage
+    :param districts: also benchmark the district-level import
+        (import_districts.py) on synthetic district tables with this many
+        districts (0: skip)
+    :return: report with the parameters, the environment and per-stage results
+    """
+    data = synthetic_frame(n_years=n_years, n_keys=n_keys, n_states=n_states,
+                           label_change_rate=label_change_rate, seed=seed)
+    stages = []
+
+    def record(name, data_in, func):
+        result, measures = _measure(func, repeat)
+        stages.append({
+            "stage": name,
+            "rows_in": None if data_in is None else len(data_in),
+            "rows_out": len(result),
+            **measures,
+        })
+        return result
+
+    if excel:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            selection = write_workbooks(data, tmpdir)
+            outfilepath = os.path.join(tmpdir, "pks.parquet")
+
+            def run_import():
+                import_data(tmpdir, outfilepath, jobs=jobs, selection=selection)
+                return pd.read_parquet(outfilepath)
+
+            data = record("import", None, run_import)
+
+    data_clean = record("clean", data, lambda: clean_labels(data.copy()))
+    data_marked = record("mark", data_clean, lambda: mark_labelchange(data_clean))
+    data_hr = record("hierarchize", data_marked, lambda: hierarchize_data(data_marked))
+    record("colormap", data_hr, lambda: make_df_colormap(data_hr))
+
+    if districts:
+        data_districts = synthetic_district_frame(n_years=n_years, n_keys=n_keys,
+                                                  n_districts=districts, seed=seed)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            selection = write_district_workbooks(data_districts, os.path.join(tmpdir, "raw"))
+            interimdir = os.path.join(tmpdir, "interim")
+            outpath = os.path.join(tmpdir, "processed")
+
+            def run_district_import():
+                import_districts(os.path.join(tmpdir, "raw"), interimdir, jobs=jobs,
+                                 selection=selection)
+                return pq.read_table(interimdir, columns=["year"])
+
+            def run_district_build():
+                build_districts(interimdir, outpath)
+                return read_districts(outpath, columns=["year"])
+
+            record("district import", None, run_district_import)
+            record("district build", data_districts, run_district_build)
+
+    return {
+        "params": {
+            "years": n_years,
+            "keys": n_keys,
+            "states": n_states,
+            "rows": len(data),
+            "label_change_rate": label_change_rate,
+            "excel": excel,
+            "jobs": jobs,
+            "repeat": repeat,
+            "seed": seed,
+            "districts": districts,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "stages": stages,
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the PKS import on synthetic data.")
+    parser.add_argument("--years", type=int, default=11)
+    parser.add_argument("--keys", type=int, default=1200)
+    parser.add_argument("--states", type=int, default=17)
+    parser.add_argument("--label-change-rate", type=float, default=0.05)
+    parser.add_argument("--excel", action="store_true",
+                        help="also benchmark reading synthetic Excel files")
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--districts", type=int, default=0,
+                        help="also benchmark the district-level import with this many districts")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        n_years=args.years,
+        n_keys=args.keys,
+        n_states=args.states,
+        label_change_rate=args.label_change_rate,
+        excel=args.excel,
+        jobs=args.jobs,
+        repeat=args.repeat,
+        seed=args.seed,
+        districts=args.districts,
+    )
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
@@ -1,18 +1,22 @@
 # Daten laden: aus variabel benannten Excel-Tabellen einen ordentlichen Datensatz machen.
 # Die Selektion der Spalten ist Handarbeit. Bei jedem neuen Jahrgang müssen wir schauen,
 # ob sich die Form geändert hat, und entsprechend anpassen.
+# Die letzten beiden Spalten (Tatverdächtige insgesamt, nichtdeutsche
+# Tatverdächtige) sind Merkmale der Tatverdächtigen; sie sind optional und
+# dürfen in einer Auswahl fehlen. Nach Geschlecht sind die Tatverdächtigen in
+# diesen Tabellen nicht aufgeschlüsselt.
 select_columns = {
-    2013: ['Strft. Schl.', 'Straftat', 'Bundesland', 'erfasste Fälle 2013',   'HZ nach Zensus', 'Versuche absolut',               'aufgeklärte Fälle'],
-    2014: ['Strft. Schl.', 'Straftat', 'Bundesland', 'erfasste Fälle 2014' ,  'HZ nach Zensus', 'Versuche absolut',               'aufgeklärte Fälle'],
-    2015: ['Schlüssel',    'Straftat', 'Bundesland', 'erfasste Fälle',        'HZ nach Zensus', 'von Spalte 4 Versuche',          'Aufklärung'],
-    2016: ['Schlüssel',    'Straftat', 'Bundesland', 'erfasste Fälle',        'HZ nach Zensus', 'von Spalte 4 Versuche',          'Aufklärung'],
-    2017: ['Schlüssel',    'Straftat', 'Bundesland', 'erfasste Fälle',        'HZ nach Zensus', 'von Spalte 4 Versuche',          'Aufklärung'],
-    2018: ['Schlüssel',    'Straftat', 'Bundesland', 'erfasste Fälle',        'HZ nach Zensus', 'von Spalte 4 Versuche',          'Aufklärung'],
-    2019: ['Schlüssel',    'Straftat', 'Bundesland', 'erfasste Fälle',        'HZ nach Zensus', 'von Spalte 4 Versuche',          'Aufklärung'],
-    2020: ['Schlüssel',    'Straftat', 'Bundesland', 'Anzahl erfasste Fälle', 'HZ',             'erfasste Fälle davon: Versuche', 'Aufklärung'],
-    2021: ['Schlüssel',    'Straftat', 'Bundesland', 'Anzahl erfasste Fälle', 'HZ',             'erfasste Fälle davon: Versuche', 'Aufklärung'],
-    2022: ['Schlüssel',    'Straftat', 'Bundesland', 'Anzahl erfasste Fälle', 'HZ',             'erfasste Fälle davon: Versuche', 'Aufklärung'],
-    2023: ['Schlüssel',    'Straftat', 'Bundesland', 'Anzahl erfasste Fälle', 'HZ',             'erfasste Fälle davon: Versuche', 'Aufklärung'],
+    2013: ['Strft. Schl.', 'Straftat', 'Bundesland', 'erfasste Fälle 2013',   'HZ nach Zensus', 'Versuche absolut',               'aufgeklärte Fälle', 'TV insges.',                'NDTV insges.'],
+    2014: ['Strft. Schl.', 'Straftat', 'Bundesland', 'erfasste Fälle 2014' ,  'HZ nach Zensus', 'Versuche absolut',               'aufgeklärte Fälle', 'TV insges.',                'NDTV insges.'],
+    2015: ['Schlüssel',    'Straftat', 'Bundesland', 'erfasste Fälle',        'HZ nach Zensus', 'von Spalte 4 Versuche',          'Aufklärung',        'Tatver-dächtige insg.',     'Nichtdeutsche Tat-verdächtige'],
+    2016: ['Schlüssel',    'Straftat', 'Bundesland', 'erfasste Fälle',        'HZ nach Zensus', 'von Spalte 4 Versuche',          'Aufklärung',        'Tatver-dächtige insg.',     'Nichtdeutsche Tat-verdächtige'],
+    2017: ['Schlüssel',    'Straftat', 'Bundesland', 'erfasste Fälle',        'HZ nach Zensus', 'von Spalte 4 Versuche',          'Aufklärung',        'Tatver-dächtige insg.',     'Nichtdeutsche Tat-verdächtige'],
+    2018: ['Schlüssel',    'Straftat', 'Bundesland', 'erfasste Fälle',        'HZ nach Zensus', 'von Spalte 4 Versuche',          'Aufklärung',        'Tatver-dächtige insg.',     'Nichtdeutsche Tat-verdächtige'],
+    2019: ['Schlüssel',    'Straftat', 'Bundesland', 'erfasste Fälle',        'HZ nach Zensus', 'von Spalte 4 Versuche',          'Aufklärung',        'Tatver-dächtige insg.',     'Nichtdeutsche Tat-verdächtige'],
+    2020: ['Schlüssel',    'Straftat', 'Bundesland', 'Anzahl erfasste Fälle', 'HZ',             'erfasste Fälle davon: Versuche', 'Aufklärung',        'Tatver-dächtige insgesamt', 'Nichtdeutsche Tat-verdächtige'],
+    2021: ['Schlüssel',    'Straftat', 'Bundesland', 'Anzahl erfasste Fälle', 'HZ',             'erfasste Fälle davon: Versuche', 'Aufklärung',        'Tatver-dächtige insgesamt', 'Nichtdeutsche Tat-verdächtige'],
+    2022: ['Schlüssel',    'Straftat', 'Bundesland', 'Anzahl erfasste Fälle', 'HZ',             'erfasste Fälle davon: Versuche', 'Aufklärung',        'Tatver-dächtige insgesamt', 'Nichtdeutsche Tat-verdächtige'],
+    2023: ['Schlüssel',    'Straftat', 'Bundesland', 'Anzahl erfasste Fälle', 'HZ',             'erfasste Fälle davon: Versuche', 'Aufklärung',        'Tatver-dächtige insgesamt', 'Nichtdeutsche Tat-verdächtige'],
 }
 
 # Spaltenbenennung vereinheitlichen
@@ -24,3 +28,44 @@ colname_map = {
     ("Versuche absolut", "von Spalte 4 Versuche", "erfasste Fälle davon: Versuche"): "versucht",
     ("aufgeklärte Fälle", "Aufklärung"): "aufgeklärt"
 }
+
+# manuelle Löschung störender Summenschlüssel
+excluded_keys = [
+    # => englischsprachig
+    "900230", "900250", "900251", "900252", "900253", "900260", "900261",
+    # => bandenmäßiger Wohnungseinbruchdiebstahl mit Tageswohnungseinbruch (very special)
+    "943520",
+    "972500",  # => illegale Einreise + Aufenthalt (in 725... enthalten)
+    # "973000",  # => Rauschgiftdelikte (in 730... enthalten)
+    "980100",  # => "Cybercrime insg."
+    "900200",  # => UN-Kram
+]
+
+# Kreistabellen (Fälle je Stadt-/Landkreis, data/raw/kreise/PKS{Jahr}.xlsx):
+# Spaltenauswahl je Jahrgang, in der Reihenfolge Schlüssel, Straftat,
+# Gemeindeschlüssel, Kreisname, Fälle, HZ, Versuche, aufgeklärte Fälle. Leer,
+# solange keine Kreistabellen vorliegen.
+select_district_columns = {
+    # 2023: ['Schlüssel', 'Straftat', 'Gemeindeschlüssel', 'Stadt-/Landkreis',
+    #        'erfasste Fälle', 'HZ', 'Versuche - Anzahl', 'aufgeklärte Fälle'],
+}
+
+# Bundesland aus den ersten beiden Stellen des Gemeindeschlüssels:
+ags_states = {
+    "01": "Schleswig-Holstein",
+    "02": "Hamburg",
+    "03": "Niedersachsen",
+    "04": "Bremen",
+    "05": "Nordrhein-Westfalen",
+    "06": "Hessen",
+    "07": "Rheinland-Pfalz",
+    "08": "Baden-Württemberg",
+    "09": "Bayern",
+    "10": "Saarland",
+    "11": "Berlin",
+    "12": "Brandenburg",
+    "13": "Mecklenburg-Vorpommern",
+    "14": "Sachsen",
+    "15": "Sachsen-Anhalt",
+    "16": "Thüringen",
+}
@@ -0,0 +1,160 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from ..data.dataset import read_processed, read_keys
+
+
+# measures held in the cube by default:
+MEASURES = ["count", "freq", "attempts", "clearance"]
+
+
+@dataclass
+class Cube:
+    """
+    Measures of the PKS dataset as dense arrays indexed by (key, state, year).
+    Cells without a reported value are NaN, and False in present. Keys, states
+    and years are sorted, so selections are plain index operations.
+
+    :param keys: key of each position on the first axis
+    :param states: state of each position on the second axis
+    :param years: year of each position on the third axis
+    :param values: dict measure -> float array of shape (keys, states, years);
+        float32 for measures stored as float32, float64 otherwise
+    :param present: bool array of the same shape, True where the dataset has a
+        row
+    :param key_info: optional DataFrame indexed by key with further key
+        attributes (e.g. color), joined by to_frame()
+    """
+    keys: np.ndarray
+    states: np.ndarray
+    years: np.ndarray
+    values: dict
+    present: np.ndarray
+    key_info: pd.DataFrame = None
+
+    def __post_init__(self):
+        self._key_pos = {key: i for i, key in enumerate(self.keys)}
+        self._state_pos = {state: i for i, state in enumerate(self.states)}
+
+    @property
+    def shape(self) -> tuple:
+        return self.present.shape
+
+    def key_positions(self, keys=None) -> np.ndarray:
+        """
+        Positions of keys on the key axis, in sorted key order; unknown keys
+        are left out.
+        """
+        if keys is None:
+            return np.arange(len(self.keys))
+        return np.array(sorted({self._key_pos[key] for key in keys if key in self._key_pos}),
+                        dtype=int)
+
+    def state_positions(self, states=None) -> np.ndarray:
+        if states is None:
+            return np.arange(len(self.states))
+        return np.array(sorted({self._state_pos[state] for state in states
+                                if state in self._state_pos}), dtype=int)
+
+    def sel(self, measure: str, keys=None, states=None) -> np.ndarray:
+        """
+        The sub-array of measure for the given keys and states (all if None),
+        with all years.
+        """
+        return self.values[measure][np.ix_(self.key_positions(keys), self.state_positions(states))]
+
+    def ratio(self, numerator: str, denominator: str, scale: float = 100.0) -> np.ndarray:
+        """
+        numerator / denominator * scale over the whole cube (e.g. clearance
+        rates of all keys in all states and years); NaN where the denominator
+        is 0 or missing.
+        """
+        den = self.values[denominator]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(den > 0, self.values[numerator] / den * scale, np.nan)
+
+    def to_frame(self, keys=None, states=None, measures: list = None) -> pd.DataFrame:
+        """
+        A long frame (key, state, year, measures and the columns of key_info)
+        of the present cells for the given keys and states, ordered by key,
+        state and year; key and state are categoricals, as returned by
+        read_processed().
+        """
+        measures = list(self.values) if measures is None else list(measures)
+        k, s = self.key_positions(keys), self.state_positions(states)
+        kk, ss, yy = np.nonzero(self.present[np.ix_(k, s)])
+        kk, ss = k[kk], s[ss]
+
+        data = {
+            "year": self.years[yy],
+            "state": pd.Categorical.from_codes(ss, categories=self.states),
+            "key": pd.Categorical.from_codes(kk, categories=self.keys),
+            **{measure: self.values[measure][kk, ss, yy] for measure in measures},
+        }
+        if self.key_info is not None:
+            info = self.key_info.reindex(self.keys)
+            for col in info.columns:
+                data[col] = info[col].to_numpy()[kk]
+
+        return pd.DataFrame(data)
+
+
+def build_cube(data: pd.DataFrame, measures: list = MEASURES, key_info: pd.DataFrame = None) -> Cube:
+    """
+    Build the cube from a long frame with one row per key, state and year.
+
+    :param data: e.g. as returned by read_processed()
+    :param measures: numeric columns to hold
+    :param key_info: see Cube
+    """
+    key_codes, keys = pd.factorize(data.key.astype(object), sort=True)
+    state_codes, states = pd.factorize(data.state.astype(object), sort=True)
+    year_codes, years = pd.factorize(data.year, sort=True)
+    shape = (len(keys), len(states), len(years))
+
+    present = np.zeros(shape, dtype=bool)
+    present[key_codes, state_codes, year_codes] = True
+
+    values = {}
+    for measure in measures:
+        # float32 measures (e.g. freq) stay float32: widened, they would show
+        # their rounding noise (3.4000000953674316) in the figures, unlike the
+        # same values from ArrowEngine
+        dtype = np.float32 if data[measure].dtype == np.float32 else float
+        array = np.full(shape, np.nan, dtype=dtype)
+        array[key_codes, state_codes, year_codes] = data[measure].to_numpy(dtype=dtype, na_value=np.nan)
+        values[measure] = array
+
+    return Cube(
+        keys=np.asarray(keys, dtype=object),
+        states=np.asarray(states, dtype=object),
+        years=np.asarray(years),
+        values=values,
+        present=present,
+        key_info=key_info,
+    )
+
+
+def load_cube(path, measures: list = MEASURES, key_columns: list = ("color",),
+              table: pa.Table = None) -> Cube:
+    """
+    Build the cube from the processed dataset, reading only the measures it
+    holds.
+
+    :param path: directory of the processed dataset
+    :param measures: numeric columns to hold
+    :param key_columns: columns of the key dimension to keep as key_info
+    :param table: the dataset as returned by read_processed_table() (e.g.
+        memory-mapped from the snapshot), to build from instead of decoding the
+        parquet files
+    """
+    columns = ["year", "state", "key", *measures]
+    if table is None:
+        data = read_processed(path, columns=columns)
+    else:
+        data = table.select(columns).to_pandas()
+    key_info = read_keys(path).set_index("key")[list(key_columns)] if key_columns else None
+    return build_cube(data, measures=measures, key_info=key_info)
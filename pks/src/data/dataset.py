@@ -0,0 +1,531 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import functools
+import operator
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+# Rows per row group. Each state holds ~11k rows (about 1,000 keys x 11 years),
+# so a row group holds about 90 keys and a partition about a dozen row groups;
+# the min/max statistics on 'key_id' then let readers skip all but one or two
+# of them per key.
+ROW_GROUP_SIZE = 1024
+
+# The dataset is stored normalized: a numeric fact table, partitioned by state
+# (path/facts/state_id=<id>/part-0.parquet) and sorted by key and year, plus
+# one table per dimension. Key and state ids follow the sorted keys and states,
+# so key ranges are id ranges.
+_fact_schema = pa.schema([
+    ("key_id", pa.int16()),
+    ("year", pa.int16()),
+    ("label_id", pa.int32()),
+    ("label_change", pa.bool_()),
+    ("count", pa.int32()),
+    ("freq", pa.float32()),
+    ("attempts", pa.int32()),
+    ("clearance", pa.int32()),
+    ("unsolved", pa.int32()),
+    ("clearance_rate", pa.float64()),
+    ("count_delta", pa.float32()),
+    ("freq_delta", pa.float32()),
+    ("suspects", pa.int32()),
+    ("suspects_foreign", pa.int32()),
+])
+
+# District-level datasets (see import_districts.py) are laid out the same way,
+# with the district as a further dimension (districts.parquet: district_id,
+# ags, district, state_id; ids follow the sorted Gemeindeschlüssel) and facts
+# sorted by key, year and district:
+_district_schema = pa.schema([
+    ("key_id", pa.int16()),
+    ("year", pa.int16()),
+    ("district_id", pa.int16()),
+    ("count", pa.int32()),
+    ("freq", pa.float32()),
+    ("attempts", pa.int32()),
+    ("clearance", pa.int32()),
+    ("unsolved", pa.int32()),
+    ("clearance_rate", pa.float64()),
+    ("count_delta", pa.float32()),
+    ("freq_delta", pa.float32()),
+])
+
+# columns of the denormalized frames returned by read_processed():
+COLUMNS = ["year", "state", "key", "label", "shortlabel", "label_change", "count", "freq",
+           "attempts", "clearance", "unsolved", "clearance_rate", "count_delta", "freq_delta",
+           "sectionwidth", "color"]
+
+# suspect attributes, stored with the facts but only read when asked for
+# (columns=...); they are nullable, as not every table reports them:
+ATTRIBUTE_COLUMNS = ["suspects", "suspects_foreign"]
+
+# Every dataset is stamped with a version.json: a hash of the content of its
+# parquet files (the version) plus build metadata. Caches of anything derived
+# from a dataset key on the version, so they stay valid exactly as long as the
+# data does.
+VERSION_FILE = "version.json"
+
+# columns of the denormalized frames returned by read_districts():
+DISTRICT_COLUMNS = ["year", "state", "ags", "district", "key", "count", "freq", "attempts",
+                    "clearance", "unsolved", "clearance_rate", "count_delta", "freq_delta"]
+
+
+def write_processed(data: pd.DataFrame, path) -> None:
+    """
+    Write the processed PKS dataset as a fact table with key, label-version and
+    state dimensions (see above). The key dimension also holds summary
+    statistics per key.
+
+    :param data: the processed dataset, one row per year, state and key,
+        including the derived metrics (see import_data_pks.add_derived_metrics)
+    :param path: directory of the dataset; replaced if it exists
+    """
+    logging.info(f"Writing processed dataset to {path}.")
+
+    # kept, so that rewriting the same data leaves version.json as it was:
+    previous = _read_version_file(path)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+
+    # dimensions:
+    keys = (data[["key", "sectionwidth", "color"]]
+            .drop_duplicates(subset="key")
+            .sort_values("key")
+            .reset_index(drop=True))
+    keys.insert(0, "key_id", np.arange(len(keys), dtype="int16"))
+    keys = keys.merge(_key_stats(data), left_on="key", right_index=True, how="left")
+
+    states = pd.DataFrame({"state": sorted(data.state.unique())})
+    states.insert(0, "state_id", np.arange(len(states), dtype="int8"))
+
+    key_ids = pd.Series(keys.key_id.values, index=keys.key)
+    data = data.assign(key_id=data.key.map(key_ids).astype("int16"))
+
+    labels = (data[["key_id", "label", "shortlabel"]]
+              .drop_duplicates()
+              .sort_values(["key_id", "label", "shortlabel"])
+              .reset_index(drop=True))
+    labels.insert(0, "label_id", np.arange(len(labels), dtype="int32"))
+
+    data = data.merge(labels, on=["key_id", "label", "shortlabel"], how="left")
+
+    keys.to_parquet(os.path.join(path, "keys.parquet"), index=False)
+    labels.to_parquet(os.path.join(path, "labels.parquet"), index=False)
+    states.to_parquet(os.path.join(path, "states.parquet"), index=False)
+
+    # facts, one partition per state:
+    for state_id, state in zip(states.state_id, states.state):
+        partition = (data.loc[data.state.eq(state)]
+                     .sort_values(["key_id", "year"])
+                     .reset_index(drop=True))
+        _write_partition(partition, path, state_id, _fact_schema)
+
+    stamp_version(path, previous=previous, rows=len(data), keys=len(keys),
+                  states=len(states),
+                  years=[int(data.year.min()), int(data.year.max())])
+
+
+def _write_partition(data: pd.DataFrame, path, state_id, schema) -> None:
+    partition_dir = os.path.join(path, "facts", f"state_id={state_id}")
+    os.makedirs(partition_dir, exist_ok=True)
+    pq.write_table(
+        pa.Table.from_pandas(data[schema.names], schema=schema, preserve_index=False),
+        os.path.join(partition_dir, "part-0.parquet"),
+        row_group_size=ROW_GROUP_SIZE,
+        write_statistics=True,
+    )
+
+
+def write_district_dimensions(path, keys: list, districts: pd.DataFrame) -> tuple:
+    """
+    Start a district-level dataset: replace path and write its dimension
+    tables. The facts are then added one state at a time with
+    write_district_partition().
+
+    :param path: directory of the dataset; replaced if it exists
+    :param keys: all keys of the dataset
+    :param districts: one row per district with the columns ags, district and
+        state
+    :return: ids of the keys, states and districts, as Series indexed by key,
+        state and ags
+    """
+    logging.info(f"Writing district dataset to {path}.")
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+
+    keys = pd.DataFrame({"key": sorted(keys)})
+    keys.insert(0, "key_id", np.arange(len(keys), dtype="int16"))
+
+    states = pd.DataFrame({"state": sorted(districts.state.unique())})
+    states.insert(0, "state_id", np.arange(len(states), dtype="int8"))
+    state_ids = pd.Series(states.state_id.values, index=states.state)
+
+    districts = districts.sort_values("ags").reset_index(drop=True)
+    districts = pd.DataFrame({
+        "district_id": np.arange(len(districts), dtype="int16"),
+        "ags": districts.ags.values,
+        "district": districts.district.values,
+        "state_id": districts.state.map(state_ids).values,
+    })
+
+    keys.to_parquet(os.path.join(path, "keys.parquet"), index=False)
+    states.to_parquet(os.path.join(path, "states.parquet"), index=False)
+    districts.to_parquet(os.path.join(path, "districts.parquet"), index=False)
+
+    return (pd.Series(keys.key_id.values, index=keys.key),
+            state_ids,
+            pd.Series(districts.district_id.values, index=districts.ags))
+
+
+def write_district_partition(data: pd.DataFrame, path, state_id: int) -> None:
+    """
+    Write the district-level facts of one state (with key_id and district_id,
+    see write_district_dimensions), sorted by key, year and district.
+    """
+    data = data.sort_values(["key_id", "year", "district_id"]).reset_index(drop=True)
+    _write_partition(data, path, state_id, _district_schema)
+
+
+def _parquet_files(path) -> list:
+    path = str(path)
+    return sorted(
+        os.path.relpath(os.path.join(dirpath, filename), path)
+        for dirpath, _, filenames in os.walk(path)
+        for filename in filenames
+        if filename.endswith(".parquet")
+    )
+
+
+def _content_hash(path) -> str:
+    """
+    Hash of the names and bytes of all parquet files of a dataset, in a fixed
+    order, reading each file in chunks.
+    """
+    digest = hashlib.sha256()
+    for relpath in _parquet_files(path):
+        digest.update(relpath.replace(os.sep, "/").encode())
+        with open(os.path.join(str(path), relpath), "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def stamp_version(path, previous: dict = None, **metadata) -> dict:
+    """
+    Write the version.json of a finished dataset: its content hash as version,
+    the build time and the library versions, plus metadata (e.g. rows, keys and
+    years). If previous (the stamp the dataset had before it was rewritten) has
+    the same version, it is written back unchanged instead.
+    """
+    version = _content_hash(path)
+    if previous is not None and previous.get("version") == version:
+        stamp = previous
+    else:
+        stamp = {
+            "version": version,
+            "built": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "pandas": pd.__version__,
+            "pyarrow": pa.__version__,
+            **metadata,
+        }
+    with open(os.path.join(str(path), VERSION_FILE), "w") as file:
+        json.dump(stamp, file, indent=2)
+    logging.info(f"Dataset {path} has version {stamp['version']}.")
+    return stamp
+
+
+def _read_version_file(path) -> dict:
+    try:
+        with open(os.path.join(str(path), VERSION_FILE)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+@functools.lru_cache(maxsize=16)
+def _cached_version(path, signature) -> dict:
+    """
+    The version.json of a dataset (or its content hash, if it has none), read
+    once per signature, see read_version().
+    """
+    stamp = _read_version_file(path)
+    if stamp is None:
+        logging.warning(f"No {VERSION_FILE} in {path}, hashing its content.")
+        stamp = {"version": _content_hash(path)}
+    return stamp
+
+
+def read_version(path) -> dict:
+    """
+    The version.json of a dataset. Datasets written before it existed are
+    hashed on the fly (only the version is known then). Either is remembered
+    until version.json or one of the parquet files changes (by modification
+    time and size), so repeated reads cost a few stat() calls.
+    """
+    path = str(path)
+    if os.path.exists(os.path.join(path, VERSION_FILE)):
+        names = [VERSION_FILE]
+    else:
+        names = _parquet_files(path)
+
+    signature = []
+    for name in names:
+        stat = os.stat(os.path.join(path, name))
+        signature.append((name, stat.st_mtime_ns, stat.st_size))
+
+    return dict(_cached_version(path, tuple(signature)))
+
+
+def dataset_version(path) -> str:
+    return read_version(path)["version"]
+
+
+def _key_stats(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Summary statistics per key: the range of freq over all states and years (as
+    stored, in float32), the first and last year the key is reported in, and
+    its federal clearance rate over all years.
+    """
+    stats = (data
+             .assign(freq=data.freq.astype("float32"))
+             .groupby("key")
+             .agg(freq_min=("freq", "min"),
+                  freq_max=("freq", "max"),
+                  first_year=("year", "min"),
+                  last_year=("year", "max")))
+    stats["first_year"] = stats.first_year.astype("int16")
+    stats["last_year"] = stats.last_year.astype("int16")
+
+    bund = data.loc[data.state.eq("Bund")].groupby("key")[["count", "clearance"]].sum()
+    stats["clearance_rate"] = (bund.clearance / bund["count"].where(bund["count"].gt(0))
+                               * 100).round(1)
+
+    return stats
+
+
+def _read_dimensions(path):
+    return _cached_dimensions(path, dataset_version(path))
+
+
+@functools.lru_cache(maxsize=4)
+def _cached_dimensions(path, version):
+    """
+    The dimension tables, read once per dataset and version.
+    """
+    return (pd.read_parquet(os.path.join(path, "keys.parquet")),
+            pd.read_parquet(os.path.join(path, "labels.parquet")),
+            pd.read_parquet(os.path.join(path, "states.parquet")))
+
+
+def _conditions(dim_keys, dim_states, states=None, keys=None, key_range=None) -> list:
+    """
+    Filter expressions on the facts for a selection of states and keys.
+    """
+    conditions = []
+    if states is not None:
+        state_ids = pd.Series(dim_states.state_id.values, index=dim_states.state)
+        ids = state_ids.reindex(list(states)).dropna().astype(int).tolist()
+        conditions.append(ds.field("state_id").isin(ids))
+    if key_range is not None:
+        start = np.searchsorted(dim_keys.key.values, key_range[0], side="left")
+        stop = np.searchsorted(dim_keys.key.values, key_range[1], side="right")
+        conditions.append((ds.field("key_id") >= start) & (ds.field("key_id") < stop))
+    if keys is not None:
+        # keys as a disjunction of equalities: unlike isin, these are checked
+        # against the row group statistics. No key has id -1, so an empty
+        # selection matches nothing.
+        key_ids = pd.Series(dim_keys.key_id.values, index=dim_keys.key)
+        ids = key_ids.reindex(list(keys)).dropna().astype(int).tolist() or [-1]
+        conditions.append(functools.reduce(operator.or_, [ds.field("key_id") == i for i in ids]))
+
+    return conditions
+
+
+def _read_facts(path, columns: list, conditions: list) -> pa.Table:
+    facts = ds.dataset(os.path.join(path, "facts"), format="parquet", partitioning="hive")
+    return facts.to_table(
+        columns=list(dict.fromkeys(columns)),
+        filter=functools.reduce(operator.and_, conditions) if conditions else None,
+    )
+
+
+def read_keys(path) -> pd.DataFrame:
+    """
+    The key dimension of the processed dataset: key, sectionwidth and color,
+    plus summary statistics (freq_min, freq_max, first_year, last_year,
+    clearance_rate) per key.
+    """
+    return _read_dimensions(str(path))[0].copy()
+
+
+def read_processed(path, states: list = None, keys: list = None, key_range: tuple = None,
+                   columns: list = None) -> pd.DataFrame:
+    """
+    Read (part of) the processed PKS dataset as one frame. Key, state and label
+    columns are categoricals, the measures have compact dtypes. Selections are
+    pushed down to the parquet reader: partitions of other states are not
+    opened, and row groups whose key statistics exclude the requested keys are
+    not decoded.
+
+    :param path: directory of the dataset, as written by write_processed()
+    :param states: only read these states (e.g. ["Bund"])
+    :param keys: only read these keys
+    :param key_range: only read keys from key_range[0] to key_range[1]
+        (inclusive)
+    :param columns: only return these columns (default: COLUMNS); add
+        ATTRIBUTE_COLUMNS to get the suspect attributes, as nullable integers
+    """
+    path = str(path)
+    dim_keys, dim_labels, dim_states = _read_dimensions(path)
+    columns = COLUMNS if columns is None else list(columns)
+
+    conditions = _conditions(dim_keys, dim_states, states, keys, key_range)
+    needed = ["key_id", "state_id", "label_id"] + [c for c in _fact_schema.names if c in columns]
+    table = _read_facts(path, needed, conditions)
+
+    # join the dimensions back as categoricals:
+    key_id = table["key_id"].to_numpy()
+    label_id = table["label_id"].to_numpy()
+    label = pd.Categorical(dim_labels.label)
+    shortlabel = pd.Categorical(dim_labels.shortlabel)
+    color = pd.Categorical(dim_keys.color)
+
+    derived = {
+        "state": lambda: pd.Categorical.from_codes(table["state_id"].to_numpy().astype("int8"),
+                                                   categories=dim_states.state),
+        "key": lambda: pd.Categorical.from_codes(key_id, categories=dim_keys.key),
+        "label": lambda: pd.Categorical.from_codes(label.codes[label_id], dtype=label.dtype),
+        "shortlabel": lambda: pd.Categorical.from_codes(shortlabel.codes[label_id],
+                                                        dtype=shortlabel.dtype),
+        "sectionwidth": lambda: dim_keys.sectionwidth.values[key_id],
+        "color": lambda: pd.Categorical.from_codes(color.codes[key_id], dtype=color.dtype),
+        **{col: functools.partial(_nullable, table, col) for col in ATTRIBUTE_COLUMNS},
+    }
+
+    return pd.DataFrame({
+        col: derived[col]() if col in derived else table[col].to_numpy()
+        for col in columns
+    })
+
+
+def _dictionary(codes: np.ndarray, values) -> pa.DictionaryArray:
+    """
+    A dictionary array over the unique values, from per-row positions into
+    values.
+    """
+    value_codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=True)
+    row_codes = value_codes[codes]
+    return pa.DictionaryArray.from_arrays(
+        pa.array(row_codes, type=pa.int32(), mask=row_codes < 0),
+        pa.array(np.asarray(uniques, dtype=object), type=pa.string()),
+    )
+
+
+def read_processed_table(path, states: list = None, keys: list = None, key_range: tuple = None,
+                         columns: list = None) -> pa.Table:
+    """
+    Like read_processed(), but as a pyarrow Table that is never converted to
+    pandas: key, state, label, shortlabel and color are dictionary arrays over
+    the dimension tables, and the key_id and state_id columns are kept for
+    filtering with pyarrow.compute.
+    """
+    path = str(path)
+    dim_keys, dim_labels, dim_states = _read_dimensions(path)
+    columns = COLUMNS if columns is None else list(columns)
+
+    conditions = _conditions(dim_keys, dim_states, states, keys, key_range)
+    needed = ["key_id", "state_id", "label_id"] + [c for c in _fact_schema.names if c in columns]
+    table = _read_facts(path, needed, conditions)
+
+    key_id = table["key_id"].to_numpy()
+    label_id = table["label_id"].to_numpy()
+
+    derived = {
+        "state": lambda: _dictionary(table["state_id"].to_numpy(), dim_states.state),
+        "key": lambda: _dictionary(key_id, dim_keys.key),
+        "label": lambda: _dictionary(label_id, dim_labels.label),
+        "shortlabel": lambda: _dictionary(label_id, dim_labels.shortlabel),
+        "sectionwidth": lambda: pa.array(dim_keys.sectionwidth.values[key_id]),
+        "color": lambda: _dictionary(key_id, dim_keys.color),
+    }
+
+    arrays = {col: derived[col]() if col in derived else table[col] for col in columns}
+    arrays["key_id"] = table["key_id"]
+    arrays["state_id"] = table["state_id"].cast(pa.int8())
+    return pa.table(arrays)
+
+
+def _nullable(table: pa.Table, col: str) -> pd.array:
+    return pd.array(table[col].to_pandas(), dtype="Int32")
+
+
+def _read_district_dimensions(path):
+    return _cached_district_dimensions(path, dataset_version(path))
+
+
+@functools.lru_cache(maxsize=4)
+def _cached_district_dimensions(path, version):
+    """
+    The dimension tables of a district-level dataset, read once per dataset and
+    version.
+    """
+    return (pd.read_parquet(os.path.join(path, "keys.parquet")),
+            pd.read_parquet(os.path.join(path, "states.parquet")),
+            pd.read_parquet(os.path.join(path, "districts.parquet")))
+
+
+def read_districts(path, keys: list = None, states: list = None, key_range: tuple = None,
+                   columns: list = None) -> pd.DataFrame:
+    """
+    Read (part of) a district-level dataset as one frame, see read_processed().
+    Only the partitions of the selected states are opened, and within them only
+    the row groups that may hold the selected keys, so reading one key costs
+    about as much as in the state-level dataset.
+
+    :param path: directory of the dataset, as written by import_districts.py
+    :param keys: only read these keys
+    :param states: only read the districts of these states
+    :param key_range: only read keys from key_range[0] to key_range[1]
+        (inclusive)
+    :param columns: only return these columns (default: DISTRICT_COLUMNS)
+    """
+    path = str(path)
+    dim_keys, dim_states, dim_districts = _read_district_dimensions(path)
+    columns = DISTRICT_COLUMNS if columns is None else list(columns)
+
+    conditions = _conditions(dim_keys, dim_states, states, keys, key_range)
+    needed = ["key_id", "district_id"] + [c for c in _district_schema.names if c in columns]
+    table = _read_facts(path, needed, conditions)
+
+    key_id = table["key_id"].to_numpy()
+    district_id = table["district_id"].to_numpy()
+    ags = pd.Categorical(dim_districts.ags)
+    district = pd.Categorical(dim_districts.district)
+    state_codes = dim_districts.state_id.to_numpy()
+
+    derived = {
+        "state": lambda: pd.Categorical.from_codes(state_codes[district_id],
+                                                   categories=dim_states.state),
+        "ags": lambda: pd.Categorical.from_codes(ags.codes[district_id], dtype=ags.dtype),
+        "district": lambda: pd.Categorical.from_codes(district.codes[district_id],
+                                                      dtype=district.dtype),
+        "key": lambda: pd.Categorical.from_codes(key_id, categories=dim_keys.key),
+    }
+
+    return pd.DataFrame({
+        col: derived[col]() if col in derived else table[col].to_numpy()
+        for col in columns
+    })
@@ -0,0 +1,94 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from ..data.cube import load_cube
+from ..data.dataset import read_processed_table
+from ..data.keyindex import build_key_index
+from ..data.snapshot import has_snapshot, read_snapshot_table
+
+
+class PandasEngine:
+    """
+    Serves the dashboard's selections from pandas: the federal frame through a
+    key index, the other states from the dense cube. With a snapshot, the cube
+    is built from its memory-mapped table rather than the parquet files; the
+    cube itself (a few MB) is still held by every worker, unlike the table of
+    ArrowEngine.
+
+    :param data_bund: the federal frame (e.g. after hierarchize_data)
+    :param path: directory of the processed dataset, for the cube
+    """
+    name = "pandas"
+
+    def __init__(self, data_bund: pd.DataFrame, path):
+        self.bund_index = build_key_index(data_bund)
+        self.cube = load_cube(path, table=read_snapshot_table(path) if has_snapshot(path) else None)
+
+    def federal(self, keys, min_count: int = None) -> pd.DataFrame:
+        """
+        The federal rows of keys, by key and year; only those with count >=
+        min_count if given.
+        """
+        data = self.bund_index.take(keys)
+        if min_count is not None:
+            data = data.loc[data["count"].ge(min_count)]
+        return data
+
+    def states(self, keys, measures: list = ("freq",)) -> pd.DataFrame:
+        """
+        The rows of keys in all states (key, state, year, measures and color),
+        by key, state and year.
+        """
+        return self.cube.to_frame(keys=keys, measures=list(measures))
+
+
+class ArrowEngine:
+    """
+    Serves the same selections from a pyarrow Table of the whole dataset,
+    filtering with pyarrow.compute kernels; only the selected rows are
+    converted to pandas. The table is memory-mapped from the dataset's snapshot
+    if there is one, and shared by all workers.
+
+    :param data_bund: unused, for the same signature as PandasEngine
+    :param path: directory of the processed dataset
+    """
+    name = "arrow"
+
+    def __init__(self, data_bund: pd.DataFrame, path):
+        self.table = read_snapshot_table(path) if has_snapshot(path) else read_processed_table(path)
+        keys = self.table.select(["key", "key_id"]).group_by(["key", "key_id"]).aggregate([])
+        self._key_ids = dict(zip(keys["key"].to_pylist(), keys["key_id"].to_pylist()))
+
+        state = self.table["state"].combine_chunks()
+        self._federal = self.table.filter(pc.equal(state.dictionary_decode(), "Bund"))
+
+    def _key_mask(self, table: pa.Table, keys):
+        ids = [self._key_ids[key] for key in keys if key in self._key_ids]
+        return pc.is_in(table["key_id"], value_set=pa.array(ids, type=pa.int16()))
+
+    def federal(self, keys, min_count: int = None) -> pd.DataFrame:
+        mask = self._key_mask(self._federal, keys)
+        if min_count is not None:
+            mask = pc.and_(mask, pc.greater_equal(self._federal["count"], min_count))
+        return self._federal.filter(mask).to_pandas()
+
+    def states(self, keys, measures: list = ("freq",)) -> pd.DataFrame:
+        selection = (self.table
+                     .filter(self._key_mask(self.table, keys))
+                     .sort_by([("key_id", "ascending"), ("state_id", "ascending"),
+                               ("year", "ascending")])
+                     .select(["key", "state", "year", *measures, "color"]))
+        return selection.to_pandas()
+
+
+ENGINES = {engine.name: engine for engine in [PandasEngine, ArrowEngine]}
+
+
+def make_engine(name: str, data_bund: pd.DataFrame, path):
+    """
+    The query engine of the given name ("pandas" or "arrow").
+    """
+    if name not in ENGINES:
+        raise KeyError(f"No engine '{name}', choose from {list(ENGINES)}.")
+    return ENGINES[name](data_bund, path)
@@ -0,0 +1,45 @@
+import openpyxl
+
+
+def iter_column_chunks(path, columns, names, chunksize=None):
+    """
+    Liest die erste Tabelle einer Excel-Datei zeilenweise (openpyxl read-only)
+    und behält nur die in columns genannten Spalten, unter den Namen names. Die
+    Überschriften werden einmal in Spaltenindizes übersetzt; leere Zeilen (etwa
+    die leeren Zeilen am Tabellenende) werden übersprungen. Sind weniger
+    Spalten als Namen angegeben, gelten die ersten Namen. Liefert die Werte als
+    dict Name -> Liste in Blöcken von höchstens chunksize Zeilen (None: ein
+    Block), sodass auch sehr große Tabellen nie ganz im Speicher liegen.
+    """
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows)
+
+        missing = [col for col in columns if col not in header]
+        if missing:
+            raise KeyError(f"{path}: Spalten {missing} nicht gefunden, "
+                           "config.py anpassen.")
+
+        indices = [header.index(col) for col in columns]
+        names = names[:len(columns)]
+        values = {name: [] for name in names}
+        nrows = 0
+
+        for row in rows:
+            cells = [row[i] if i < len(row) else None for i in indices]
+            if all(cell is None for cell in cells):
+                continue
+            for name, cell in zip(names, cells):
+                values[name].append(cell)
+            nrows += 1
+
+            if nrows == chunksize:
+                yield values
+                values = {name: [] for name in names}
+                nrows = 0
+
+        if nrows or chunksize is None:
+            yield values
+    finally:
+        workbook.close()
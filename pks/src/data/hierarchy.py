@@ -0,0 +1,216 @@
+from dataclasses import dataclass, fields
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class Hierarchy:
+    """
+    The key hierarchy as arrays over node positions 0..n-1 (the order in which
+    the keys were given to build_hierarchy()). Built once, it answers
+    structural queries without scanning any data frame.
+
+    :param keys: key of each node
+    :param parent: position of each node's parent, -1 for roots
+    :param child_offsets: children of node i are
+        child_index[child_offsets[i]:child_offsets[i + 1]]
+    :param child_index: all children, grouped by parent, in the order the keys
+        were given
+    :param depth: 0 for roots, parent's depth + 1 otherwise
+    :param order: nodes in depth-first preorder (an Euler tour of entries)
+    :param enter: position of each node in order
+    :param exit: position in order after the node's last descendant, so that
+        the subtree of node i is order[enter[i]:exit[i]]
+    """
+    keys: np.ndarray
+    parent: np.ndarray
+    child_offsets: np.ndarray
+    child_index: np.ndarray
+    depth: np.ndarray
+    order: np.ndarray
+    enter: np.ndarray
+    exit: np.ndarray
+
+    def __post_init__(self):
+        self._positions = {key: i for i, key in enumerate(self.keys)}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key) -> bool:
+        return key in self._positions
+
+    @property
+    def nchildren(self) -> np.ndarray:
+        return np.diff(self.child_offsets)
+
+    @property
+    def roots(self) -> np.ndarray:
+        return np.flatnonzero(self.parent < 0)
+
+    def position(self, key) -> int:
+        return self._positions[key]
+
+    def positions(self, keys) -> np.ndarray:
+        """
+        Node positions of keys; -1 for keys that are not in the hierarchy.
+        """
+        return np.array([self._positions.get(key, -1) for key in keys], dtype=np.int32)
+
+    def children(self, key) -> list:
+        """
+        The children of key, in the order the keys were given ([] for unknown
+        keys).
+        """
+        i = self._positions.get(key)
+        if i is None:
+            return []
+        return self.keys[self.child_index[self.child_offsets[i]:self.child_offsets[i + 1]]].tolist()
+
+    def descendants(self, key) -> list:
+        """
+        All keys below key, depth first.
+        """
+        i = self._positions[key]
+        return self.keys[self.order[self.enter[i] + 1:self.exit[i]]].tolist()
+
+    def ancestors(self, key) -> list:
+        """
+        The parent of key, its parent and so on up to the root.
+        """
+        result = []
+        i = self.parent[self._positions[key]]
+        while i >= 0:
+            result.append(self.keys[i])
+            i = self.parent[i]
+        return result
+
+    def is_descendant(self, key, ancestor) -> bool:
+        i, j = self._positions[key], self._positions[ancestor]
+        return self.enter[j] < self.enter[i] < self.exit[j]
+
+    def generations(self) -> list:
+        """
+        Node positions generation by generation (roots, their children, ...),
+        breadth first: each generation lists the children of the previous one
+        parent by parent.
+        """
+        result = []
+        generation = self.roots
+        while len(generation):
+            result.append(generation)
+            starts = self.child_offsets[generation]
+            sizes = self.child_offsets[generation + 1] - starts
+            # concatenated child ranges of all parents in the generation:
+            offsets = np.repeat(starts - (np.cumsum(sizes) - sizes), sizes)
+            generation = self.child_index[offsets + np.arange(sizes.sum())]
+        return result
+
+    def subtree_sum(self, values) -> np.ndarray:
+        """
+        For every node, the sum of values over the node and all its
+        descendants.
+
+        :param values: one value per node position
+        """
+        cumsum = np.concatenate([[0], np.cumsum(np.asarray(values, dtype=float)[self.order])])
+        return cumsum[self.exit] - cumsum[self.enter]
+
+    def descendant_sum(self, values) -> np.ndarray:
+        """
+        For every node, the sum of values over all its descendants (without the
+        node itself).
+        """
+        return self.subtree_sum(values) - np.asarray(values, dtype=float)
+
+    def children_sum(self, values) -> np.ndarray:
+        """
+        For every node, the sum of values over its direct children; e.g. to
+        compare the reported count of a key with the counts of its sub-keys.
+        """
+        values = np.asarray(values, dtype=float)
+        has_parent = self.parent >= 0
+        return np.bincount(self.parent[has_parent], weights=values[has_parent],
+                           minlength=len(self))
+
+
+def build_hierarchy(keys, parents) -> Hierarchy:
+    """
+    Build the array-backed hierarchy from unique keys and each key's parent key
+    (None/NaN for roots). Parents that are not among the keys make their
+    children roots.
+
+    :param keys: unique keys
+    :param parents: parent key of each key
+    """
+    keys = np.asarray(list(keys), dtype=object)
+    positions = {key: i for i, key in enumerate(keys)}
+    if len(positions) != len(keys):
+        raise ValueError("Keys of a hierarchy must be unique.")
+    n = len(keys)
+
+    parent = np.array([-1 if pd.isna(p) else positions.get(p, -1) for p in parents],
+                      dtype=np.int32)
+    has_parent = parent >= 0
+
+    # children grouped by parent (CSR), each group in the order the keys were
+    # given:
+    child_index = np.flatnonzero(has_parent)[np.argsort(parent[has_parent], kind="stable")]
+    child_offsets = np.zeros(n + 1, dtype=np.int32)
+    child_offsets[1:] = np.cumsum(np.bincount(parent[has_parent], minlength=n))
+
+    # depth-first preorder, with an explicit stack:
+    order = np.empty(n, dtype=np.int32)
+    depth = np.zeros(n, dtype=np.int32)
+    stack = np.flatnonzero(~has_parent)[::-1].tolist()
+    visited = 0
+    while stack:
+        node = stack.pop()
+        order[visited] = node
+        visited += 1
+        children = child_index[child_offsets[node]:child_offsets[node + 1]]
+        depth[children] = depth[node] + 1
+        stack.extend(children[::-1].tolist())
+
+    if visited != n:
+        raise ValueError("Parents of a hierarchy must not form a cycle.")
+
+    enter = np.empty(n, dtype=np.int32)
+    enter[order] = np.arange(n, dtype=np.int32)
+
+    # subtree sizes, from the deepest nodes up:
+    size = np.ones(n, dtype=np.int32)
+    for level in range(depth.max(initial=0), 0, -1):
+        nodes = np.flatnonzero(depth == level)
+        np.add.at(size, parent[nodes], size[nodes])
+
+    return Hierarchy(
+        keys=keys,
+        parent=parent,
+        child_offsets=child_offsets,
+        child_index=child_index,
+        depth=depth,
+        order=order,
+        enter=enter,
+        exit=enter + size,
+    )
+
+
+def write_hierarchy(hierarchy: Hierarchy, filepath) -> None:
+    """
+    Save the arrays of a hierarchy to a .npz file, for read_hierarchy().
+    """
+    arrays = {field.name: getattr(hierarchy, field.name) for field in fields(Hierarchy)}
+    arrays["keys"] = arrays["keys"].astype(str)
+    np.savez(filepath, **arrays)
+
+
+def read_hierarchy(filepath) -> Hierarchy:
+    """
+    Load a hierarchy saved with write_hierarchy(), without building it again.
+    """
+    with np.load(filepath) as arrays:
+        hierarchy = {field.name: arrays[field.name] for field in fields(Hierarchy)}
+    hierarchy["keys"] = hierarchy["keys"].astype(object)
+    return Hierarchy(**hierarchy)
@@ -1,13 +1,37 @@
 import sys
 import os
+import re
+import glob
+import hashlib
+import argparse
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import lru_cache
 from typing import Annotated
-from textwrap import wrap, shorten
+from textwrap import shorten
 import logging
 
+import numpy as np
 import pandas as pd
-
-from ..data.config import colname_map, select_columns
-from ..visualization.visualize import make_df_colormap
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ..data.config import select_columns, excluded_keys
+from ..data.dataset import write_processed, read_processed
+from ..data.excel import iter_column_chunks
+from ..data.hierarchy import Hierarchy, build_hierarchy
+from ..data.pipeline import Stage, run_pipeline
+from ..data.startup import write_startup
+from ..visualization.visualize import (
+    make_df_colormap,
+    wrap_label,
+    get_catalog,
+    get_sunburst,
+    color_map_from_color_column,
+)
+from ..visualization.colormap import hsv_to_css_array, hsvtraj_batch
 
 
 sys.path.append("..")  # necessary when used by a notebook
@@ -19,16 +43,50 @@ logging.basicConfig(
 )
 
 
+# Zielspalten in der Reihenfolge der Spaltenauswahl in config.py:
+_columns = ["key", "label", "state", "count", "freq", "attempts", "clearance", "suspects", "suspects_foreign"]
+
+# Merkmale der Tatverdächtigen: optional, fehlen sie in der Auswahl, bleiben
+# sie leer (NA):
+_attribute_columns = ["suspects", "suspects_foreign"]
+
+# Schema der Zwischendatei (data/interim/pks.parquet), für alle Jahrgänge
+# gleich:
+_interim_schema = pa.schema([
+    ("year", pa.int64()),
+    ("state", pa.string()),
+    ("key", pa.string()),
+    ("label", pa.string()),
+    ("count", pa.int64()),
+    ("freq", pa.float64()),
+    ("attempts", pa.int64()),
+    ("clearance", pa.int64()),
+    ("suspects", pa.int64()),
+    ("suspects_foreign", pa.int64()),
+])
+
+
+def _read_columns(path, columns):
+    """
+    Hilfsfunktion.
+    Liest die ausgewählten Spalten einer Excel-Datei auf einmal, siehe
+    excel.iter_column_chunks.
+    """
+    values, = iter_column_chunks(path, columns, _columns)
+    return values
+
+
 # loading function takes over column selection, naming, historization and string cleaning:
 def _load_n_trim(dir, yr, columns):
     """
     Hilfsfunktion.
-    Lädt einen DataFrame und 
+    Lädt die ausgewählten Spalten eines Jahrgangs als DataFrame.
     """
     logging.info(f"Opening Excel file PKS{yr}.xlsx.")
-    data = (pd.read_excel(f"{dir}/PKS{yr}.xlsx")[columns]
-            .set_axis(['key', 'label', 'state', 'count', 'freq', 'attempts', 'clearance'], axis=1)
-            .rename(colname_map)
+    data = (pd.DataFrame(_read_columns(f"{dir}/PKS{yr}.xlsx", columns))
+            .reindex(columns=_columns)
+            .astype({"count": "int64", "freq": "float64", "attempts": "int64", "clearance": "int64",
+                     **{col: "Int64" for col in _attribute_columns}})
             .assign(**{"year": yr})
             )
 
@@ -38,110 +96,223 @@ def _load_n_trim(dir, yr, columns):
     return data
 
 
-def import_data(indirpath: Annotated[str, "Quellordner mit den Excel-Dateien"],
-                outfilepath: Annotated[str, "Zielordner und -Dateiname für die parquet-Datei"],
-                format: str = "parquet") -> None:
+def _year_fingerprint(dir, yr, columns) -> str:
+    """
+    Hilfsfunktion.
+    Inhaltshash einer Excel-Datei zusammen mit ihrer Spaltenauswahl aus
+    config.py; ändert sich eins von beiden, muss der Jahrgang neu eingelesen
+    werden.
+    """
+    digest = hashlib.sha256()
+    with open(f"{dir}/PKS{yr}.xlsx", "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(repr(columns).encode("utf-8"))
+
+    return digest.hexdigest()[:16]
+
+
+def _load_year(dir, yr, columns, cachedir=None):
+    """
+    Hilfsfunktion.
+    Wie _load_n_trim, aber mit einem Cache je Jahrgang in cachedir:
+    unveränderte Jahrgänge werden aus PKS{yr}-{fingerprint}.parquet gelesen
+    statt aus der Excel-Datei.
+    """
+    if cachedir is None:
+        return _load_n_trim(dir, yr, columns)
+
+    cachefile = os.path.join(cachedir, f"PKS{yr}-{_year_fingerprint(dir, yr, columns)}.parquet")
+
+    if os.path.exists(cachefile):
+        logging.info(f"Loading PKS{yr} from cache {cachefile}.")
+        return pd.read_parquet(cachefile)
+
+    data = _load_n_trim(dir, yr, columns)
+
+    # veraltete Einträge dieses Jahrgangs entfernen, dann neu ablegen:
+    for stale in glob.glob(os.path.join(cachedir, f"PKS{yr}-*.parquet")):
+        os.remove(stale)
+    os.makedirs(cachedir, exist_ok=True)
+    data.to_parquet(cachefile)
+
+    return data
+
+
+def _load_years_ordered(executor, jobs, indirpath, years, columns, cachedir):
     """
-    Daten aus den heruntergeladenen Excel-Dateien in einen sauberen Datenframe importieren.
+    Hilfsfunktion.
+    Liest die Jahrgänge mit executor ein und liefert sie nach Jahr geordnet.
+    Anders als executor.map() wird ein weiterer Jahrgang erst eingereicht, wenn
+    ein fertiger abgeholt wurde: So warten nie mehr als jobs Ergebnisse im
+    Hauptprozess darauf, geschrieben zu werden.
     """
-    logging.info(f"Importing Data from {indirpath} to {outfilepath}.")
-    data = pd.concat([_load_n_trim(indirpath, yr, columns)
-                     for yr, columns in select_columns.items()])
+    pending = deque()
+    todo = iter(zip(years, columns))
 
-    # Label 'Bund' vereinheitlichen:
-    data.replace({"Bund echte Zählung der Tatverdächtigen": "Bund",
-                  "Bundesrepublik Deutschland": "Bund"}, inplace=True)
+    for yr, cols in itertools.islice(todo, jobs):
+        pending.append(executor.submit(_load_year, indirpath, yr, cols, cachedir))
 
-    # Index und Sortierung:
-    data.set_index(["year", "state", "key",
-                   "label"], inplace=True)
-    data.sort_index(inplace=True)
-    data.reset_index(inplace=True)
+    while pending:
+        # nichts mehr vom gelieferten Jahrgang festhalten, er soll nach dem
+        # Schreiben frei werden:
+        yield pending.popleft().result()
+        for yr, cols in itertools.islice(todo, 1):
+            pending.append(executor.submit(_load_year, indirpath, yr, cols, cachedir))
 
-    if format == "parquet":
-        data.to_parquet(outfilepath)
 
-    elif format == "csv":
-        data.to_csv(outfilepath)
+def import_data(indirpath: Annotated[str, "Quellordner mit den Excel-Dateien"],
+                outfilepath: Annotated[str, "Zielordner und -Dateiname für die parquet-Datei"],
+                format: str = "parquet",
+                jobs: Annotated[int, "Anzahl paralleler Prozesse zum Einlesen"] = 1,
+                cachedir: Annotated[str, "Ordner für den Cache je Jahrgang (None: kein Cache)"] = None,
+                selection: Annotated[dict, "Spaltenauswahl je Jahrgang"] = select_columns) -> None:
+    """
+    Daten aus den heruntergeladenen Excel-Dateien in einen sauberen Datenframe
+    importieren. Mit jobs > 1 wird jeder Jahrgang in einem eigenen Prozess
+    eingelesen; die Ergebnisse werden unabhängig von der
+    Fertigstellungsreihenfolge nach Jahr zusammengeführt. Dabei sind höchstens
+    jobs Jahrgänge gleichzeitig in Arbeit, sodass der Speicherbedarf nicht mit
+    der Zahl der Jahrgänge wächst. Mit cachedir werden nur neue oder geänderte
+    Jahrgänge aus Excel gelesen. selection ersetzt die Spaltenauswahl aus
+    config.py (z.B. für synthetische Tabellen).
+    """
+    logging.info(f"Importing Data from {indirpath} to {outfilepath} using {jobs} job(s).")
+    years = sorted(selection.keys())
+    columns = [selection[yr] for yr in years]
+
+    if jobs > 1:
+        executor = ProcessPoolExecutor(max_workers=min(jobs, len(years)))
+        frames = _load_years_ordered(executor, jobs, indirpath, years, columns, cachedir)
+    else:
+        executor = None
+        frames = (_load_year(indirpath, yr, cols, cachedir) for yr, cols in zip(years, columns))
+
+    # jeder Jahrgang wird einzeln geschrieben (parquet: als eigene row group),
+    # sodass nie mehr als ein Jahrgang fertig aufbereitet im Speicher liegt:
+    writer = None
+    nrows = 0
+    try:
+        for data in frames:
+            # Label 'Bund' vereinheitlichen:
+            data = data.replace({"Bund echte Zählung der Tatverdächtigen": "Bund",
+                                 "Bundesrepublik Deutschland": "Bund"})
+
+            # Sortierung: Jahre kommen schon geordnet, also innerhalb des
+            # Jahrgangs:
+            data = (data[_interim_schema.names]
+                    .sort_values(["state", "key", "label"], kind="stable")
+                    .reset_index(drop=True))
+
+            if format == "parquet":
+                table = pa.Table.from_pandas(data, schema=_interim_schema, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(outfilepath, _interim_schema)
+                writer.write_table(table)
+
+            elif format == "csv":
+                data.index += nrows
+                data.to_csv(outfilepath, mode="w" if nrows == 0 else "a", header=nrows == 0)
+
+            nrows += len(data)
+    finally:
+        if writer is not None:
+            writer.close()
+        if executor is not None:
+            executor.shutdown()
+
+    logging.info(f"Imported {nrows} rows.")
 
 
 def hierarchize_keys(keylist: pd.Series, parent_col_name="parent", level_col_name="level") -> pd.DataFrame:
     """
-    Takes a unique key list, adds columns for inferred levels and parents.
+    Takes a unique, sorted key list, adds columns for inferred levels and
+    parents.
+
+    A key's raw level is the position of the leftmost character in which it
+    differs from its predecessor. Its parent is the nearest preceding key of a
+    lower raw level, which a stack of still-open ancestors yields in a single
+    pass. Since children may differ from their parent more than one place
+    further right, levels are then re-set to "your parent's level + 1".
     """
     logging.info(f"Hierarchizing key list of {len(keylist)} entries.")
-    level = level_col_name
-    parent = parent_col_name
-
-    # the shape of the result:
-    df = pd.DataFrame({"key": keylist,
-                       level: None,
-                       parent: None})
-
-    # (1) level: identify the level at which a key resides
-
-    df.iloc[0, df.columns.get_loc(level)] = 1
-
-    for k in range(1, len(df)):
-        key_i = df.key.iloc[k-1]
-        key_j = df.key.iloc[k]
-
-        # this key's leftmost character change = level:
-        for digit in range(6):
-            if key_j[digit] != key_i[digit]:
-                this_level = digit + 1
-                break
-
-        df.loc[k, level] = this_level
-
-    # (2) parent: infer parent from whether each key is lower, higher or equal to its predecessor
-
-    # level: |dummy|       1       |  2  |  3  |  4  |  5  |  6  |
-    parents = [None, df.key.iloc[0], None, None, None, None, None]
-
-    for k in range(1, len(df)):
-        predecessor_level = df[level].iloc[k-1]
-        this_keys_level = df[level].iloc[k]
-
-        if this_keys_level == 1:
-            df.iloc[k, df.columns.get_loc(parent)] = None
-            parents[1] = df.iloc[k, df.columns.get_loc("key")]
-
-        elif this_keys_level > predecessor_level:
-            # this condition also allows having a digit change >1 places behind the parent, so
-            # we can have children with level 4 to parents with level 2.
-            df.iloc[k, df.columns.get_loc(parent)] = df.iloc[k-1, df.columns.get_loc("key")]
-            parents[this_keys_level] = df.iloc[k, df.columns.get_loc("key")]
-
-        elif this_keys_level < predecessor_level:
-            # this works but should have a clearer structure.
-            # look at all above
-            search_area = df.loc[df.key.lt(df.key.iloc[k])]
-            search_area = search_area.loc[search_area[level].lt(
-                df[level].iloc[k])]  # limit to higher levels
-            # level of the last higher key
-            last_higher_level = search_area[level].iloc[-1]
-            df.iloc[k, df.columns.get_loc(parent)] = parents[last_higher_level]
-            parents[this_keys_level] = df.iloc[k, df.columns.get_loc("key")]
-
-        elif this_keys_level == predecessor_level:
-            # this works but should have a clearer structure.
-            # look at all above
-            search_area = df.loc[df.key.lt(df.key.iloc[k])]
-            search_area = search_area.loc[search_area[level].lt(
-                df[level].iloc[k])]  # limit to higher levels
-            # level of the last higher key
-            last_higher_level = search_area[level].iloc[-1]
-            df.iloc[k, df.columns.get_loc(parent)] = parents[last_higher_level]
-            parents[this_keys_level] = df.iloc[k, df.columns.get_loc("key")]
-    
-    # it's got hierarchy now, but we have children of level > n+1 to parents of level n.
-    # re-set levels to "your parent's level + 1":
-    for lab, grp in df.groupby(["level", "parent"], sort=True):
-        parents_level = df.loc[df.key.eq(lab[1]), "level"].iloc[0]
-        df.loc[df.parent.eq(lab[1]), "level"] = parents_level + 1
 
-    return df
+    keys = keylist.tolist()
+    levels = [0] * len(keys)
+    parents = [None] * len(keys)
+
+    # (raw level, position) of the keys that can still receive children:
+    stack = []
+
+    for k, key in enumerate(keys):
+        if k == 0:
+            raw_level = 1
+        else:
+            # this key's leftmost character change = level:
+            predecessor = keys[k - 1]
+            raw_level = next(
+                (digit for digit, (i, j) in enumerate(zip(predecessor, key)) if i != j),
+                min(len(predecessor), len(key)),
+            ) + 1
+
+        # close all branches that are not above this key:
+        while stack and stack[-1][0] >= raw_level:
+            stack.pop()
+
+        if stack:
+            parent_pos = stack[-1][1]
+            parents[k] = keys[parent_pos]
+            levels[k] = levels[parent_pos] + 1
+        else:
+            levels[k] = 1
+
+        stack.append((raw_level, k))
+
+    return pd.DataFrame({"key": keys,
+                         level_col_name: levels,
+                         parent_col_name: parents})
+
+
+def section_widths(keys, parents, root: str = "------", weights: dict = None) -> dict:
+    """
+    Going down the hierarchy from root, give each key its share of the sunburst
+    circle. Siblings split their parent's width evenly; if weights (e.g. case
+    counts per key) are given, they split it in proportion to their weights
+    instead.
+
+    :param keys: all keys
+    :param parents: each key's parent (None for the root)
+    :param root: the key at the center, which gets width 1
+    :param weights: optional dict key -> weight
+    :return: dict key -> width; keys not below root are left out
+    """
+    tree = build_hierarchy(keys, parents)
+    if root not in tree:
+        return {}
+
+    if weights is None:
+        weight = np.ones(len(tree))
+    else:
+        weight = np.array([weights.get(key, 0) for key in tree.keys], dtype=float)
+
+    # each key's share of its parent's width:
+    share = np.ones(len(tree))
+    child = tree.parent >= 0
+    parent = tree.parent[child]
+    total = tree.children_sum(weight)[parent]
+    share[child] = np.where(total > 0, weight[child] / np.where(total > 0, total, 1),
+                            1 / tree.nchildren[parent])
+
+    # the subtree of root, level by level:
+    r = tree.position(root)
+    subtree = tree.order[tree.enter[r]:tree.exit[r]]
+    width = np.zeros(len(tree))
+    width[r] = 1.0
+    for level in range(tree.depth[r] + 1, tree.depth[subtree].max() + 1):
+        nodes = subtree[tree.depth[subtree] == level]
+        width[nodes] = width[tree.parent[nodes]] * share[nodes]
+
+    return dict(zip(tree.keys[subtree].tolist(), width[subtree].tolist()))
 
 
 def hierarchize_data(data: pd.DataFrame, parent_col_name: str = "parent", level_col_name: str = "level") -> pd.DataFrame:
@@ -157,7 +328,8 @@ def hierarchize_data(data: pd.DataFrame, parent_col_name: str = "parent", level_
     """
     logging.info("Hierarchizing data.")
     
-    data = data.filter(["year", "state", "key", "label", "shortlabel", "label_change", "count", "freq", "attempts", "clearance", "color"])
+    data = data.filter(["year", "state", "key", "label", "shortlabel", "label_change", "count", "freq", "attempts", "clearance",
+                        "unsolved", "clearance_rate", "count_delta", "freq_delta", *_attribute_columns, "color"])
 
     allkeys = data.key.drop_duplicates().reset_index(drop=True)
     root_key = allkeys.loc[allkeys.eq("------")]
@@ -204,29 +376,12 @@ def hierarchize_data(data: pd.DataFrame, parent_col_name: str = "parent", level_
     # display params. So here, we add an 'sb_angle' (sunburst angle) column that encodes
     # this width:
     df = keys_hierarchized
- 
-    df["sectionwidth"] = 0.0
-    df["width_on_level"] = None
-    df.loc[df.level.eq(0), "sectionwidth"] = 1.0
-    df.loc[df.level.eq(0), "width_on_level"] = 1
     df.loc[df.level.eq(0), "parent"] = None
 
     logging.debug("Setting the section widths for keys.")
 
-    for level in range(7):
-        
-        # since levels are stated explicitly in our data, we could also just go through
-        # them and set width to 1 / items on level. The procedure here is more general
-        # and would also work without stated levels.
-        for parent, siblings_df in df.loc[df.level.eq(level)].groupby("parent"):
-            width_on_level = 1 / len(siblings_df)
-            parent_width = df.loc[df.key.eq(parent), "sectionwidth"].iloc[0]
-            sectionwidth = parent_width * width_on_level
-
-            df.loc[df.parent.eq(parent), "width_on_level"] = width_on_level
-            df.loc[df.parent.eq(parent), "sectionwidth"] = sectionwidth
-
-    df = df.drop("width_on_level", axis=1)
+    widths = section_widths(df.key, df.parent, root="------")
+    df["sectionwidth"] = df.key.map(widths).fillna(0.0)
 
     # join this hierarchy information to the actual crime data:
     data_hier = pd.merge(
@@ -241,51 +396,59 @@ def hierarchize_data(data: pd.DataFrame, parent_col_name: str = "parent", level_
     return (data_hier)
 
 
-def clean_labels(data: pd.DataFrame) -> pd.DataFrame:
-    
-    logging.info("Cleaning labels.")
+# patterns for the abbreviated labels, see _clean_label():
+_removables = [
+    r"§.*$",
+    r".und zwar.*$",
+    r".darunter:.*$",
+    r".gemäß.?$",
+    r".gem\..?$",
+    r".davon:.?$",
+    r".nach.?$",
+]
+
+_replacements = {
+    r"insgesamt": "insg.",
+    r"dergleichen": "dgl.",
+}
 
-    # nonbreaking spaces
-    data.label = data.label.str.replace(r"[\u00A0]", " ", regex=True)
 
-    # leading/trailing spaces
-    data.label = data.label.str.strip()
+@lru_cache(maxsize=None)
+def _clean_label(label: str) -> tuple:
+    """
+    Clean a single raw label, return it as (label, shortlabel).
+    """
+    # nonbreaking spaces, leading/trailing spaces:
+    label = re.sub(r"[\u00A0]", " ", label).strip()
 
-    # create an abbreviated label column for annotations
+    # create an abbreviated label for annotations
     # (full labels can still go into the tooltips):
-    data["shortlabel"] = data.label
-    removables = [
-        r"§.*$",
-        r".und zwar.*$",
-        r".darunter:.*$",
-        r".gemäß.?$",
-        r".gem\..?$",
-        r".davon:.?$",
-        r".nach.?$",
-    ]
+    shortlabel = label
+    for removable in _removables:
+        shortlabel = re.sub(removable, "", shortlabel)
 
-    replacements = {
-        r"insgesamt": "insg.",
-        r"dergleichen": "dgl.",
-    }
+    for pat, repl in _replacements.items():
+        shortlabel = re.sub(pat, repl, shortlabel)
 
-    for removable in removables:
-        data.shortlabel = data.shortlabel.str.replace(
-            removable, "", regex=True)
+    shortlabel = shorten(shortlabel, width=60, placeholder="...")
 
-    for pat, repl in replacements.items():
-        data.shortlabel = data.shortlabel.str.replace(pat, repl, regex=True)
+    # for the full-length labels, add linebreaks for especially long exemplars:
+    return wrap_label(label, 100), shortlabel
 
-    data.shortlabel = data.apply(
-        lambda row: shorten(
-            row.shortlabel,
-            width=60,
-            placeholder="..."),
-        axis=1
-    )
 
-    # for the full-length labels, add linebreaks for especially long exemplars:
-    data.label = data.apply(lambda x: "<br>".join(wrap(x.label, 100)), axis=1)
+def clean_labels(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Clean labels and add abbreviated labels in a 'shortlabel' column. There are
+    only a few thousand distinct labels among all rows, so each one is cleaned
+    once and mapped back.
+    """
+    logging.info("Cleaning labels.")
+
+    codes, uniques = pd.factorize(data.label)
+    cleaned = [_clean_label(label) for label in uniques]
+
+    data.label = np.array([label for label, _ in cleaned], dtype=object)[codes]
+    data["shortlabel"] = np.array([short for _, short in cleaned], dtype=object)[codes]
 
     return data
 
@@ -293,66 +456,155 @@ def clean_labels(data: pd.DataFrame) -> pd.DataFrame:
 def mark_labelchange(data: pd.DataFrame) -> pd.DataFrame:
     """
     Mark where the label of a key has changed compared to the previous year.
+    Within each (state, key), the first year a short label appears in is
+    marked; a key that returns to a label it has had before is not marked
+    again.
     """
     logging.info("Marking label changes for display.")
     data = data.sort_values(["state", "key", "year"])
-    data["label_change"] = False
-
-    data_temp = pd.DataFrame()
+    data["label_change"] = ~data.duplicated(["state", "key", "shortlabel"])
 
-    for i, grp in data.groupby(["state", "key", "shortlabel"]):
-        this = grp.copy().reset_index()
-        this.loc[this.index[0], "label_change"] = True
-        data_temp = pd.concat([data_temp, this])
-    data = data_temp.sort_values(["key", "year"])
+    data = data.sort_values(["key", "year", "state"]).reset_index(drop=True)
 
     return data
 
 
-if __name__ == "__main__":
+def add_colors(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add each key's color from the hierarchy, then drop the hierarchy columns.
+    """
+    global_colormap = make_df_colormap(data)
+    data["color"] = data.key.map(global_colormap)
 
-    # transport the data from Excel files to a processable form without much processing:
-    
-    logging.info("Checking if interim file already exists.")
-    
-    outfilepath = "data/interim/pks.parquet"
+    return data.drop(["level", "parent"], axis=1)
 
-    if os.path.exists(outfilepath):
-       logging.info("It does.")
-    else:
-        import_data(
-            indirpath="data/raw/",
-            outfilepath=outfilepath
-        )
-
-    data = pd.read_parquet("data/interim/pks.parquet")
-
-    # clean labels from §§ and so on, then mark label changes:
-    data_clean = clean_labels(data)
-    data_marked = mark_labelchange(data_clean)
-    # data_marked = data  # toggle comment for this and 2 prev rows for fast run
-
-    data_hr = hierarchize_data(data_marked)
-    global_colormap = make_df_colormap(data_hr)
-    data_hr["color"] = data_hr.key.apply(
-        lambda key: global_colormap[key]
+
+def exclude_keys(data: pd.DataFrame, keys: list = excluded_keys) -> pd.DataFrame:
+    """
+    Remove the keys listed in config.excluded_keys.
+    """
+    logging.info(f"Excluding {len(keys)} keys.")
+    return data.loc[~data.key.isin(keys)].drop("index", axis=1)
+
+
+def add_derived_metrics(data: pd.DataFrame, region: str = "state") -> pd.DataFrame:
+    """
+    Add what the dashboard shows besides the reported figures: unsolved cases,
+    the clearance rate in percent (NaN without cases) and the change in count
+    and freq compared to the previous year the key was reported in for the same
+    region.
+
+    :param region: column of the regional unit ("state", or e.g. "ags" for
+        districts)
+    """
+    logging.info("Adding derived metrics.")
+    data = data.sort_values([region, "key", "year"])
+
+    data["unsolved"] = data["count"] - data.clearance
+    data["clearance_rate"] = (data.clearance / data["count"].where(data["count"].gt(0)) * 100).round(1)
+
+    by_key = data.groupby([region, "key"], sort=False, observed=True)
+    data["count_delta"] = by_key["count"].diff()
+    data["freq_delta"] = by_key.freq.diff()
+
+    return data.sort_values(["key", "year", region]).reset_index(drop=True)
+
+
+def build_startup(data_bund: pd.DataFrame) -> tuple:
+    """
+    The catalog, key hierarchy and initial sunburst figure of the dashboard,
+    inferring the hierarchy of the federal keys. The catalog is passed on to
+    get_sunburst(), which adds its display columns to it.
+
+    :param data_bund: the federal frame, as read by read_processed()
+    :return: catalog, hierarchy, sunburst
+    """
+    data_bund = hierarchize_data(data_bund)
+    catalog = get_catalog(data_bund)
+    hierarchy = build_hierarchy(catalog.key, catalog.parent)
+    sunburst = get_sunburst(
+        catalog,
+        colormap=color_map_from_color_column(data_bund),
+        hierarchy=hierarchy,
     )
+    return catalog, hierarchy, sunburst
 
-    data_hr = data_hr.drop(["level", "parent"], axis=1)
 
-    # manuelle Löschung störender Summenschlüssel
-    data_hr = data_hr.loc[~data_hr.key.isin([
-        # => englischsprachig
-        "900230", "900250", "900251", "900252", "900253", "900260", "900261",
-        # => bandenmäßiger Wohnungseinbruchdiebstahl mit Tageswohnungseinbruch (very special)
-        "943520",
-        "972500",  # => illegale Einreise + Aufenthalt (in 725... enthalten)
-        # "973000",  # => Rauschgiftdelikte (in 730... enthalten)
-        "980100",  # => "Cybercrime insg."
-        "900200",  # => UN-Kram
-    ])]
+def import_pipeline(indirpath: str = "data/raw/",
+                    interimpath: str = "data/interim/pks.parquet",
+                    outpath: str = "data/processed/pks",
+                    jobs: int = 1,
+                    cachedir: str = "data/interim/years") -> list:
+    """
+    The stages of the import, from the Excel files to the processed dataset,
+    for run_pipeline().
+    """
+    def import_stage():
+        import_data(indirpath=indirpath, outfilepath=interimpath, jobs=jobs, cachedir=cachedir)
+        return pd.read_parquet(interimpath)
+
+    def write_stage(data):
+        write_processed(data, outpath)
+        # what the dashboard shows before any interaction, from the written
+        # federal rows:
+        write_startup(outpath, *build_startup(read_processed(outpath, states=["Bund"])))
+
+    sources = [(yr, _year_fingerprint(indirpath, yr, columns))
+               for yr, columns in sorted(select_columns.items())]
+
+    return [
+        # transport the data from Excel files to a processable form without
+        # much processing:
+        Stage("import", import_stage, params=sources,
+              code=[import_data, _load_years_ordered, _load_year, _load_n_trim,
+                    _read_columns, iter_column_chunks]),
+        # clean labels from §§ and so on, then mark label changes:
+        Stage("clean", clean_labels, inputs=["import"],
+              params=(_removables, _replacements),
+              code=[_clean_label, wrap_label]),
+        Stage("mark", mark_labelchange, inputs=["clean"]),
+        Stage("hierarchize", hierarchize_data, inputs=["mark"],
+              code=[hierarchize_keys, section_widths, build_hierarchy,
+                    Hierarchy]),
+        Stage("colorize", add_colors, inputs=["hierarchize"],
+              code=[make_df_colormap, hsvtraj_batch, hsv_to_css_array,
+                    build_hierarchy, Hierarchy]),
+        Stage("exclude", exclude_keys, inputs=["colorize"],
+              params=excluded_keys),
+        Stage("derive", add_derived_metrics, inputs=["exclude"]),
+        Stage("write", write_stage, inputs=["derive"], params=outpath,
+              code=[write_processed, write_startup, build_startup],
+              checkpoint=False),
+    ]
 
-    data_hr.drop("index", axis=1, inplace=True)
+if __name__ == "__main__":
 
-    logging.info("Saving imported and processed data to parquet.")
-    data_hr.to_parquet("data/processed/pks.parquet")
+    parser = argparse.ArgumentParser(description="PKS-Rohdaten importieren und aufbereiten.")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="Anzahl paralleler Prozesse beim Einlesen der Excel-Dateien")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="alle Jahrgänge neu aus Excel lesen, ohne Cache in data/interim/years/ "
+                             "(und damit alle Schritte neu berechnen)")
+    parser.add_argument("--stage",
+                        help="nur diesen Schritt neu berechnen (Eingaben aus den Zwischenständen)")
+    parser.add_argument("--force", action="store_true",
+                        help="alle Schritte neu berechnen, auch wenn Zwischenstände aktuell sind")
+    parser.add_argument("--report",
+                        default=f"data/interim/reports/import-{datetime.now():%Y%m%d-%H%M%S}.json",
+                        help="Laufbericht (JSON) mit Zeiten, Speicher und Zeilenzahlen je Schritt")
+    args = parser.parse_args()
+
+    # every stage leaves a checkpoint in data/interim/; stages whose inputs and
+    # code are unchanged are loaded from there instead of being run again.
+    # Without the year cache the import stage (and so everything after it) has
+    # to run, its checkpoint would be reused:
+    run_pipeline(
+        import_pipeline(
+            jobs=args.jobs,
+            cachedir=None if args.no_cache else "data/interim/years",
+        ),
+        checkpoint_dir="data/interim",
+        only=args.stage,
+        force=args.force or args.no_cache,
+        report=args.report,
+    )
@@ -0,0 +1,187 @@
+import os
+import sys
+import glob
+import shutil
+import numbers
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ..data.config import select_district_columns, ags_states, excluded_keys
+from ..data.dataset import write_district_dimensions, write_district_partition, stamp_version
+from ..data.excel import iter_column_chunks
+from ..data.import_data_pks import add_derived_metrics
+
+
+# Zielspalten der Kreistabellen in der Reihenfolge der Spaltenauswahl in
+# config.py:
+_district_columns = ["key", "label", "ags", "district", "count", "freq", "attempts", "clearance"]
+
+# Schema der Zwischenstände
+# (data/interim/districts/<Land>/PKS{Jahr}-<Block>.parquet):
+_interim_schema = pa.schema([
+    ("year", pa.int64()),
+    ("state", pa.string()),
+    ("ags", pa.string()),
+    ("district", pa.string()),
+    ("key", pa.string()),
+    ("count", pa.int64()),
+    ("freq", pa.float64()),
+    ("attempts", pa.int64()),
+    ("clearance", pa.int64()),
+])
+
+# Zeilen je Block beim Einlesen; mehr liegt je Prozess nie als DataFrame im
+# Speicher:
+CHUNKSIZE = 100_000
+
+
+def _state_dirs(interimdir) -> list:
+    return sorted(path for path in glob.glob(os.path.join(interimdir, "*")) if os.path.isdir(path))
+
+
+def _codes(values: pd.Series, width: int) -> pd.Series:
+    """
+    Hilfsfunktion.
+    Schlüssel als Text mit width Stellen. Excel liefert sie oft als Zahl (int
+    oder float wie 1001.0) und damit ohne führende Nullen; Zahlen werden über
+    int in Text übersetzt, dann wird links mit Nullen aufgefüllt. Text wie
+    "****00" bleibt, wie er ist.
+    """
+    return values.map(
+        lambda value: str(int(value)) if isinstance(value, numbers.Real) else str(value).strip()
+    ).str.zfill(width)
+
+
+def _import_year(indirpath, yr, columns, interimdir, chunksize=CHUNKSIZE) -> int:
+    """
+    Hilfsfunktion.
+    Liest die Kreistabelle eines Jahrgangs blockweise und legt jeden Block nach
+    Land aufgeteilt in interimdir ab. Das Land ergibt sich aus dem
+    Gemeindeschlüssel. Gibt die Zahl der übernommenen Zeilen zurück.
+    """
+    logging.info(f"Opening district table PKS{yr}.xlsx.")
+    path = os.path.join(indirpath, f"PKS{yr}.xlsx")
+    nrows = 0
+
+    for n, values in enumerate(iter_column_chunks(path, columns, _district_columns, chunksize)):
+        data = (pd.DataFrame(values)
+                .astype({"district": str, "count": "int64", "freq": "float64",
+                         "attempts": "int64", "clearance": "int64"})
+                .assign(year=yr))
+
+        # Excel liefert Schlüssel und Gemeindeschlüssel oft als Zahl, ohne
+        # führende Nullen:
+        data["key"] = _codes(data.key, 6)
+        data["ags"] = _codes(data.ags, 5)
+        data = data.loc[~data.key.isin(excluded_keys)]
+
+        data["state"] = data.ags.str[:2].map(ags_states)
+        data["district"] = data.district.str.replace(u"\xa0", u" ").str.strip()
+
+        unknown = data.state.isna()
+        if unknown.any():
+            logging.warning(f"PKS{yr}: {unknown.sum()} Zeilen mit unbekanntem Gemeindeschlüssel "
+                            f"({sorted(data.ags[unknown].unique())[:5]}) verworfen.")
+            data = data.loc[~unknown]
+
+        for state, grp in data.groupby("state"):
+            statedir = os.path.join(interimdir, state)
+            os.makedirs(statedir, exist_ok=True)
+            pq.write_table(
+                pa.Table.from_pandas(grp[_interim_schema.names], schema=_interim_schema,
+                                     preserve_index=False),
+                os.path.join(statedir, f"PKS{yr}-{n}.parquet"),
+            )
+
+        nrows += len(data)
+
+    return nrows
+
+
+def import_districts(indirpath="data/raw/kreise", interimdir="data/interim/districts", jobs=1,
+                     selection=select_district_columns, chunksize=CHUNKSIZE) -> int:
+    """
+    Kreistabellen aller Jahrgänge aus den Excel-Dateien
+    (indirpath/PKS{Jahr}.xlsx) nach interimdir einlesen, aufgeteilt nach Land.
+    Jeder Prozess hält höchstens einen Block von chunksize Zeilen im Speicher;
+    mit jobs > 1 werden die Jahrgänge parallel gelesen. selection ersetzt die
+    Spaltenauswahl aus config.py (z.B. für synthetische Tabellen).
+
+    :return: Zahl der eingelesenen Zeilen
+    """
+    logging.info(f"Importing district tables from {indirpath} to {interimdir} using {jobs} job(s).")
+    if os.path.exists(interimdir):
+        shutil.rmtree(interimdir)
+    os.makedirs(interimdir)
+
+    years = sorted(selection.keys())
+    args = ([indirpath] * len(years), years, [selection[yr] for yr in years],
+            [interimdir] * len(years), [chunksize] * len(years))
+
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(years))) as executor:
+            counts = list(executor.map(_import_year, *args))
+    else:
+        counts = list(map(_import_year, *args))
+
+    logging.info(f"Imported {sum(counts)} district rows.")
+    return sum(counts)
+
+
+def build_districts(interimdir="data/interim/districts",
+                    outpath="data/processed/pks_districts") -> None:
+    """
+    Aus den Zwischenständen den Kreisdatensatz bauen (Aufbau siehe dataset.py),
+    ein Land nach dem anderen: erst die Dimensionen (Schlüssel, Kreise mit
+    ihrem jüngsten Namen), dann je Land die Fakten mit den abgeleiteten
+    Kennzahlen je Kreis und Schlüssel.
+    """
+    keys = set()
+    districts = []
+    nrows = 0
+
+    for statedir in _state_dirs(interimdir):
+        data = pq.read_table(statedir, columns=["year", "state", "ags", "district", "key"]).to_pandas()
+        keys.update(data.key.unique())
+        districts.append(data.sort_values("year").drop_duplicates(subset="ags", keep="last")
+                         [["ags", "district", "state"]])
+
+    key_ids, state_ids, district_ids = write_district_dimensions(
+        outpath, keys, pd.concat(districts, ignore_index=True)
+    )
+
+    for statedir in _state_dirs(interimdir):
+        data = add_derived_metrics(pq.read_table(statedir).to_pandas(), region="ags")
+        state = data.state.iloc[0]
+        logging.info(f"Writing districts of {state} ({len(data)} rows).")
+
+        data["key_id"] = data.key.map(key_ids).astype("int16")
+        data["district_id"] = data.ags.map(district_ids).astype("int16")
+        write_district_partition(data, outpath, state_ids[state])
+        nrows += len(data)
+
+    stamp_version(outpath, rows=nrows, keys=len(key_ids), states=len(state_ids),
+                  districts=len(district_ids))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="PKS-Kreistabellen importieren und aufbereiten.")
+    parser.add_argument("--indir", default="data/raw/kreise",
+                        help="Ordner mit den Kreistabellen (PKS{Jahr}.xlsx)")
+    parser.add_argument("--out", default="data/processed/pks_districts",
+                        help="Zielordner des Kreisdatensatzes")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="Anzahl paralleler Prozesse beim Einlesen der Excel-Dateien")
+    args = parser.parse_args()
+
+    if not select_district_columns:
+        sys.exit("Keine Kreistabellen in config.select_district_columns eingetragen.")
+
+    import_districts(indirpath=args.indir, jobs=args.jobs)
+    build_districts(outpath=args.out)
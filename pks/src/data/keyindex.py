@@ -0,0 +1,50 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class KeyIndex:
+    """
+    A frame sorted by key, with the positional range of each key's rows: the
+    rows of key k are data.iloc[start:stop] for (start, stop) = ranges[k].
+    Slicing k keys then costs O(k + rows returned) instead of a scan over the
+    whole frame.
+
+    :param data: the frame, sorted by key
+    :param ranges: dict key -> (start, stop)
+    """
+    data: pd.DataFrame
+    ranges: dict
+
+    def take(self, keys) -> pd.DataFrame:
+        """
+        The rows of keys, in the frame's (key) order; unknown keys are left
+        out.
+        """
+        ranges = sorted(self.ranges[key] for key in set(keys) if key in self.ranges)
+        if not ranges:
+            return self.data.iloc[:0]
+
+        positions = np.concatenate([np.arange(start, stop) for start, stop in ranges])
+        return self.data.iloc[positions]
+
+
+def build_key_index(data: pd.DataFrame, key: str = "key") -> KeyIndex:
+    """
+    Sort data by key (stable, so rows of a key keep their order) unless it
+    already is, and index the row range of every key.
+
+    :param data: the frame
+    :param key: name of the key column
+    """
+    keys = data[key].astype(object).to_numpy()
+    if not pd.Index(keys).is_monotonic_increasing:
+        order = np.argsort(keys, kind="stable")
+        data, keys = data.iloc[order], keys[order]
+
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=int)
+    stops = np.r_[starts[1:], len(keys)]
+
+    return KeyIndex(data=data, ranges=dict(zip(keys[starts], zip(starts.tolist(), stops.tolist()))))
@@ -0,0 +1,320 @@
+import gc
+import os
+import ctypes
+import sys
+import glob
+import json
+import time
+import hashlib
+import inspect
+import logging
+import platform
+import resource
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Callable
+
+import pandas as pd
+
+
+@dataclass
+class Stage:
+    """
+    One step of a data pipeline.
+
+    :param name: name of the stage, also used for its checkpoint file
+    :param func: computes the output; called with the outputs of the input
+        stages, in order
+    :param inputs: names of the stages whose outputs func takes
+    :param params: anything else the output depends on (e.g. hashes of source
+        files); must have a stable repr()
+    :param code: further functions (or classes) the output depends on, besides
+        func, e.g. the helpers it calls
+    :param checkpoint: store the output (a DataFrame) as parquet in the
+        checkpoint directory; stages without a checkpoint (e.g. the final
+        write) run every time
+    """
+    name: str
+    func: Callable
+    inputs: list = field(default_factory=list)
+    params: object = None
+    code: list = field(default_factory=list)
+    checkpoint: bool = True
+
+
+def _code_version(funcs) -> str:
+    """
+    Hash the source of funcs, each under its qualified name. Only the
+    functions themselves are hashed, not the modules around them: editing one
+    stage leaves the checkpoints of the others valid, and a module hashes the
+    same whether it runs as __main__ or is imported. Helpers a stage calls
+    therefore belong in its code list.
+    """
+    digest = hashlib.sha256()
+    for func in funcs:
+        digest.update(func.__qualname__.encode("utf-8"))
+        digest.update(inspect.getsource(func).encode("utf-8"))
+
+    return digest.hexdigest()
+
+
+def fingerprints(stages: list) -> dict:
+    """
+    Fingerprint every stage by its code version, its params and the
+    fingerprints of its inputs. Stages must be listed after the stages they
+    take as inputs.
+    """
+    result = {}
+
+    for stage in stages:
+        digest = hashlib.sha256()
+        digest.update(stage.name.encode("utf-8"))
+        digest.update(_code_version([stage.func] + stage.code).encode("utf-8"))
+        digest.update(repr(stage.params).encode("utf-8"))
+        for name in stage.inputs:
+            digest.update(result[name].encode("utf-8"))
+        result[stage.name] = digest.hexdigest()[:16]
+
+    return result
+
+
+def _reset_peak_rss() -> None:
+    """
+    Reset the peak resident set size of this process, so that the next reading
+    covers only what follows (Linux only; elsewhere the peak of the whole run
+    is reported). Freed memory is first handed back to the system, so that the
+    peak starts from what is still in use rather than from what earlier stages
+    left behind.
+    """
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except OSError:
+        pass
+
+
+def _maxrss_kb(who) -> int:
+    peak_kb = resource.getrusage(who).ru_maxrss
+    if sys.platform == "darwin":  # bytes instead of kB
+        peak_kb //= 1024
+    return peak_kb
+
+
+def _peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process in MiB since the last
+    _reset_peak_rss().
+    """
+    peak_kb = None
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    peak_kb = int(line.split()[1])
+    except OSError:
+        pass
+    if peak_kb is None:
+        peak_kb = _maxrss_kb(resource.RUSAGE_SELF)
+
+    return peak_kb / 1024
+
+
+def _shape(data) -> dict:
+    """
+    Rows and distinct keys of a stage's input or output (None for anything but
+    DataFrames).
+    """
+    if not isinstance(data, pd.DataFrame):
+        return {"rows": None, "keys": None}
+    return {"rows": len(data), "keys": int(data["key"].nunique()) if "key" in data else None}
+
+
+def _measure(func, *args):
+    """
+    Call func(*args), measuring wall time, CPU time (including finished child
+    processes) and peak RSS. The peak of child processes (e.g. import workers)
+    is reported separately, and only for the call that ended them: the kernel
+    keeps the largest peak of all children ever waited for, which would
+    otherwise carry over to every later call.
+    """
+    children_kb = _maxrss_kb(resource.RUSAGE_CHILDREN)
+    _reset_peak_rss()
+    wall, cpu = time.perf_counter(), os.times()
+    result = func(*args)
+    wall, cpu_end = time.perf_counter() - wall, os.times()
+    cpu = sum(cpu_end[:4]) - sum(cpu[:4])
+
+    measures = {
+        "seconds": round(wall, 4),
+        "cpu_seconds": round(cpu, 4),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+    if _maxrss_kb(resource.RUSAGE_CHILDREN) > children_kb:
+        measures["children_peak_rss_mb"] = round(
+            _maxrss_kb(resource.RUSAGE_CHILDREN) / 1024, 1)
+
+    return result, measures
+
+
+@dataclass
+class _Run:
+    """
+    The state of one run_pipeline() call: the outputs resolved so far, how many
+    stages have yet to take each one as input, and the report entry of every
+    stage.
+    """
+    by_name: dict
+    fingerprints: dict
+    checkpoint_dir: str
+    force: bool
+    consumers: dict
+    keep: set
+    outputs: dict = field(default_factory=dict)
+    entries: dict = field(default_factory=dict)
+
+
+def _load_stage(run: _Run, name: str, path: str):
+    logging.info(f"Stage '{name}' is up to date, loading {path}.")
+    result, measures = _measure(pd.read_parquet, path)
+    run.entries[name].update(status="loaded", **measures, input=None, output=_shape(result))
+    return result
+
+
+def _run_stage(run: _Run, stage: Stage, path: str):
+    args = [_output(run, input_name, rerun=run.force) for input_name in stage.inputs]
+    logging.info(f"Running stage '{stage.name}'.")
+    result, measures = _measure(stage.func, *args)
+    run.entries[stage.name].update(
+        status="run", **measures,
+        input={input_name: _shape(arg) for input_name, arg in zip(stage.inputs, args)},
+        output=_shape(result),
+    )
+    logging.info(f"Stage '{stage.name}' took {measures['seconds']:.2f} s.")
+
+    # inputs no other stage still takes are not held until the end of the run:
+    del args
+    for input_name in stage.inputs:
+        _release(run, input_name)
+
+    if stage.checkpoint:
+        for stale in glob.glob(os.path.join(run.checkpoint_dir, f"{stage.name}-*.parquet")):
+            os.remove(stale)
+        os.makedirs(run.checkpoint_dir, exist_ok=True)
+        result.to_parquet(path)
+
+    return result
+
+
+def _release(run: _Run, name: str) -> None:
+    run.consumers[name] -= 1
+    if run.consumers[name] == 0 and name not in run.keep:
+        run.outputs.pop(name, None)
+
+
+def _output(run: _Run, name: str, rerun: bool = False):
+    """
+    The output of stage name: loaded from its checkpoint if it is up to date
+    (and rerun is not set), else computed from the outputs of its inputs.
+    """
+    if name in run.outputs:
+        return run.outputs[name]
+
+    stage = run.by_name[name]
+    path = os.path.join(run.checkpoint_dir, f"{name}-{run.fingerprints[name]}.parquet")
+
+    if stage.checkpoint and not rerun and os.path.exists(path):
+        result = _load_stage(run, name, path)
+    else:
+        result = _run_stage(run, stage, path)
+
+    run.outputs[name] = result
+    return result
+
+
+def _report(run: _Run, stages: list, started: datetime, only: str) -> dict:
+    return {
+        "started": started.isoformat(timespec="seconds"),
+        "seconds": round((datetime.now().astimezone() - started).total_seconds(), 4),
+        "only": only,
+        "force": run.force,
+        "environment": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "stages": [run.entries[stage.name] for stage in stages],
+    }
+
+
+def run_pipeline(stages: list, checkpoint_dir, only: str = None, force: bool = False,
+                 report: str = None) -> dict:
+    """
+    Run the stages that are out of date. A stage whose checkpoint
+    ({name}-{fingerprint}.parquet in checkpoint_dir) exists is not run; its
+    checkpoint is only loaded if a later stage that does have to run takes it
+    as input.
+
+    :param stages: list of Stage, each listed after its inputs
+    :param checkpoint_dir: directory for the checkpoints
+    :param only: run just this stage (even if it has a checkpoint), taking its
+        inputs from their checkpoints where possible; later stages are not run
+    :param force: run all stages, ignoring existing checkpoints
+    :param report: write a JSON report of the run to this path: per stage its
+        fingerprint, whether it was run, loaded from its checkpoint or skipped,
+        wall and CPU time, peak RSS (and that of the child processes it ended,
+        if any), and the rows and keys it took and returned. Reports of
+        different runs can be compared by fingerprint and params (e.g. the
+        hashes of the source files).
+    :return: dict stage name -> output of the stages no other stage takes as
+        input (or of only); the outputs of all other stages are dropped as soon
+        as the stages taking them have run
+    """
+    consumers = {stage.name: 0 for stage in stages}
+    for stage in stages:
+        for name in stage.inputs:
+            consumers[name] += 1
+    if only is None:
+        targets = [name for name, count in consumers.items() if count == 0]
+    else:
+        targets = [only]
+
+    fps = fingerprints(stages)
+    run = _Run(
+        by_name={stage.name: stage for stage in stages},
+        fingerprints=fps,
+        checkpoint_dir=checkpoint_dir,
+        force=force,
+        consumers=consumers,
+        keep=set(targets),
+        entries={stage.name: {"stage": stage.name, "fingerprint": fps[stage.name],
+                              "params": stage.params, "status": "skipped"}
+                 for stage in stages},
+    )
+    started = datetime.now().astimezone()
+
+    if only is not None and only not in run.by_name:
+        raise KeyError(f"No stage '{only}', choose from {list(run.by_name)}.")
+
+    # work backwards from the targets:
+    for name in targets:
+        _output(run, name, rerun=force or name == only)
+
+    if report is not None:
+        _write_report(report, _report(run, stages, started, only))
+
+    return {name: run.outputs[name] for name in targets}
+
+
+def _write_report(path, report: dict) -> None:
+    dirname = os.path.dirname(path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2, default=repr)
+    logging.info(f"Run report written to {path}.")
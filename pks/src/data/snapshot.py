@@ -0,0 +1,108 @@
+import os
+import json
+import argparse
+import logging
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from ..data.dataset import read_processed, read_processed_table, dataset_version
+
+
+# The snapshot holds the data the dashboard loads at startup, built once per
+# dataset, inside the dataset directory, so write_processed() removes it along
+# with the dataset it was built from (the catalog, hierarchy and sunburst are
+# kept with the dataset, see startup.py):
+#   snapshot/bund.arrow    the federal frame, as read by read_processed()
+#   snapshot/facts.arrow   the whole dataset, see read_processed_table()
+#   snapshot/version.json  the dataset version it was built from, written last
+# The tables are uncompressed Arrow IPC (Feather v2) files and memory-mapped
+# when read: all server workers on a host share the page cache instead of
+# holding their own copies, and opening costs no parsing or decompression. A
+# snapshot of another version is not used.
+SNAPSHOT_DIR = "snapshot"
+_FILES = ["bund.arrow", "facts.arrow"]
+
+
+def snapshot_path(path, filename: str) -> str:
+    return os.path.join(str(path), SNAPSHOT_DIR, filename)
+
+
+def snapshot_version(path) -> str:
+    """
+    The dataset version the snapshot in path was built from (None without a
+    snapshot).
+    """
+    try:
+        with open(snapshot_path(path, "version.json")) as file:
+            return json.load(file)["version"]
+    except FileNotFoundError:
+        return None
+
+
+def has_snapshot(path) -> bool:
+    """
+    Whether path has a complete snapshot of its current version.
+    """
+    version = snapshot_version(path)
+    if version is None or not all(os.path.exists(snapshot_path(path, f)) for f in _FILES):
+        return False
+
+    if version != dataset_version(path):
+        logging.warning(f"Snapshot of {path} is outdated, rebuild it with 'make snapshot'.")
+        return False
+    return True
+
+
+def write_snapshot(path) -> None:
+    """
+    Build the snapshot of a processed dataset (see above).
+
+    :param path: directory of the dataset, as written by write_processed()
+    """
+    logging.info(f"Writing snapshot of {path}.")
+    os.makedirs(os.path.join(str(path), SNAPSHOT_DIR), exist_ok=True)
+
+    # a snapshot is only complete with its version.json:
+    if os.path.exists(snapshot_path(path, "version.json")):
+        os.remove(snapshot_path(path, "version.json"))
+
+    feather.write_feather(read_processed(path, states=["Bund"]), snapshot_path(path, "bund.arrow"),
+                          compression="uncompressed")
+    feather.write_feather(read_processed_table(path), snapshot_path(path, "facts.arrow"),
+                          compression="uncompressed")
+
+    with open(snapshot_path(path, "version.json"), "w") as file:
+        json.dump({"version": dataset_version(path)}, file)
+
+
+def _map_table(filepath) -> pa.Table:
+    # the buffers of the table point into the mapped file, nothing is copied:
+    return pa.ipc.open_file(pa.memory_map(filepath, "r")).read_all()
+
+
+def read_snapshot_table(path) -> pa.Table:
+    """
+    The whole dataset as a memory-mapped pyarrow Table, see
+    read_processed_table().
+    """
+    return _map_table(snapshot_path(path, "facts.arrow"))
+
+
+def read_snapshot_bund(path) -> pd.DataFrame:
+    """
+    The federal frame. Only this small frame is converted to pandas (and thus
+    copied); its source pages are shared like those of the table.
+    """
+    return _map_table(snapshot_path(path, "bund.arrow")).to_pandas()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Snapshot des PKS-Datensatzes für das Dashboard bauen.")
+    parser.add_argument("--path", default="data/processed/pks",
+                        help="Ordner des aufbereiteten Datensatzes")
+    args = parser.parse_args()
+
+    write_snapshot(args.path)
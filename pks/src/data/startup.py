@@ -0,0 +1,79 @@
+import os
+import json
+import logging
+
+import pandas as pd
+import pyarrow.feather as feather
+
+from ..data.dataset import dataset_version
+from ..data.hierarchy import Hierarchy, write_hierarchy, read_hierarchy
+
+
+# What the dashboard shows before any interaction, built by the import's write
+# stage (see import_data_pks.build_startup) and kept with the dataset, so that
+# it is under version control along with it:
+#   startup/catalog.arrow  one row per key, for the text search
+#   startup/hierarchy.npz  the arrays of the key hierarchy
+#   startup/sunburst.json  the initial sunburst figure
+#   startup/version.json   the dataset version they stem from, written last
+STARTUP_DIR = "startup"
+_FILES = ["catalog.arrow", "hierarchy.npz", "sunburst.json"]
+
+
+def startup_path(path, filename: str) -> str:
+    return os.path.join(str(path), STARTUP_DIR, filename)
+
+
+def has_startup(path) -> bool:
+    """
+    Whether path has complete startup files of its current version.
+    """
+    try:
+        with open(startup_path(path, "version.json")) as file:
+            version = json.load(file)["version"]
+    except FileNotFoundError:
+        return False
+
+    if not all(os.path.exists(startup_path(path, f)) for f in _FILES):
+        return False
+    if version != dataset_version(path):
+        logging.warning(f"Startup files of {path} are outdated, rebuild them with 'make data'.")
+        return False
+    return True
+
+
+def write_startup(path, catalog: pd.DataFrame, hierarchy: Hierarchy, sunburst) -> None:
+    """
+    Write the startup files of a processed dataset.
+
+    :param path: directory of the dataset, as written by write_processed()
+    :param catalog: one row per key, as shown in the text search
+    :param hierarchy: the key hierarchy
+    :param sunburst: the initial sunburst figure
+    """
+    logging.info(f"Writing startup files of {path}.")
+    os.makedirs(os.path.join(str(path), STARTUP_DIR), exist_ok=True)
+
+    # the files are only complete with their version.json:
+    if os.path.exists(startup_path(path, "version.json")):
+        os.remove(startup_path(path, "version.json"))
+
+    feather.write_feather(catalog.reset_index(drop=True), startup_path(path, "catalog.arrow"))
+    write_hierarchy(hierarchy, startup_path(path, "hierarchy.npz"))
+    with open(startup_path(path, "sunburst.json"), "w") as file:
+        file.write(sunburst.to_json())
+
+    with open(startup_path(path, "version.json"), "w") as file:
+        json.dump({"version": dataset_version(path)}, file)
+
+
+def read_startup(path) -> tuple:
+    """
+    The catalog, key hierarchy and initial sunburst of a dataset; the sunburst
+    as a figure dict, as dcc.Graph takes it.
+    """
+    catalog = feather.read_feather(startup_path(path, "catalog.arrow"))
+    hierarchy = read_hierarchy(startup_path(path, "hierarchy.npz"))
+    with open(startup_path(path, "sunburst.json")) as file:
+        sunburst = json.load(file)
+    return catalog, hierarchy, sunburst
@@ -0,0 +1,265 @@
+import os
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+
+# the 16 Länder and the federal total, as in the BKA tables (after import):
+STATES = [
+    "Baden-Württemberg", "Bayern", "Berlin", "Brandenburg", "Bremen", "Bund", "Hamburg",
+    "Hessen", "Mecklenburg-Vorpommern", "Niedersachsen", "Nordrhein-Westfalen",
+    "Rheinland-Pfalz", "Saarland", "Sachsen", "Sachsen-Anhalt", "Schleswig-Holstein",
+    "Thüringen",
+]
+
+# header of the recent BKA tables, including the columns the import does not
+# select:
+HEADER = [
+    "Schlüssel", "Straftat", "Bundesland", "Anzahl erfasste Fälle", "HZ",
+    "erfasste Fälle davon: Versuche", None, "Aufklärung", None, "Tatver-dächtige insgesamt",
+    "Nichtdeutsche Tat-verdächtige", None,
+]
+
+# the columns config.select_columns would list for such a table:
+SELECT = [
+    "Schlüssel", "Straftat", "Bundesland", "Anzahl erfasste Fälle", "HZ",
+    "erfasste Fälle davon: Versuche", "Aufklärung", "Tatver-dächtige insgesamt",
+    "Nichtdeutsche Tat-verdächtige",
+]
+
+_WORDS = [
+    "Diebstahl", "Betrug", "Körperverletzung", "Sachbeschädigung", "Urkundenfälschung",
+    "Raub", "Erpressung", "Hehlerei", "Unterschlagung", "Nötigung", "Bedrohung",
+    "unter", "erschwerenden", "Umständen", "von", "aus", "in", "mit", "Kraftwagen",
+    "Wohnungen", "Banken", "Waffen", "Rauschgift", "Computern", "gewerbsmäßig",
+    "bandenmäßig", "und", "dergleichen", "insgesamt", "Straftaten", "gegen",
+]
+
+_SUFFIXES = [
+    "", "", "", " § 263 StGB", " §§ 242, 243 StGB", " und zwar:", " darunter:", " gemäß",
+]
+
+
+def synthetic_keys(n_keys: int, seed: int = 0) -> list:
+    """
+    A sorted list of about n_keys PKS-like keys: the root "------", a hierarchy
+    of 6-digit keys in which children sometimes skip a digit position (as in
+    the real catalog), and a separate hierarchy of keys with asterisks (about
+    5% of all keys).
+
+    :param n_keys: number of keys to generate
+    :param seed: random seed
+    """
+    rng = np.random.default_rng(seed)
+    n_asterisk = max(1, n_keys // 20)
+    n_numeric = max(1, n_keys - n_asterisk - 1)
+
+    # numeric keys: start with the top level, then keep adding children to
+    # random keys
+    keys = {f"{d}00000" for d in range(1, min(9, n_numeric) + 1)}
+    candidates = sorted(keys)
+
+    while len(keys) < n_numeric and candidates:
+        parent = candidates[rng.integers(len(candidates))]
+        depth = len(parent.rstrip("0"))
+        if depth >= 6:
+            candidates.remove(parent)
+            continue
+
+        # mostly the next position, sometimes the one after it:
+        position = min(5, depth + (1 if rng.random() < 0.15 else 0))
+        child = parent[:position] + str(rng.integers(1, 10)) + parent[position + 1:]
+
+        if child not in keys:
+            keys.add(child)
+            candidates.append(child)
+
+    # asterisk keys, as in ****00, ***100, *10*00, 3***00, 3**100, 310*00:
+    asterisk = ["****00"]
+    prefixes = ["*"] + [str(d) for d in range(3, 10)]
+    while len(asterisk) < n_asterisk:
+        prefix = prefixes[(len(asterisk) // 12) % len(prefixes)]
+        if prefix != "*" and f"{prefix}***00" not in asterisk:
+            asterisk.append(f"{prefix}***00")
+        asterisk.append(f"{prefix}**{rng.integers(1, 10)}00")
+        asterisk.append(f"{prefix}{rng.integers(1, 100):02d}*00")
+        asterisk = list(dict.fromkeys(asterisk))
+
+    return sorted(["------"] + sorted(keys) + asterisk[:n_asterisk])
+
+
+def _label(rng) -> str:
+    words = rng.choice(_WORDS, size=rng.integers(2, 20))
+    return " ".join(words).capitalize() + rng.choice(_SUFFIXES)
+
+
+def synthetic_frame(n_years: int = 11, n_keys: int = 1200, n_states: int = 17,
+                    label_change_rate: float = 0.05, first_year: int = 2013,
+                    seed: int = 0) -> pd.DataFrame:
+    """
+    A DataFrame shaped like the interim PKS dataset (year, state, key, label,
+    count, freq, attempts, clearance, suspects, suspects_foreign), with every
+    key present in every year and state.
+
+    :param n_years: number of years
+    :param n_keys: number of keys, see synthetic_keys()
+    :param n_states: number of states (at most 17); "Bund" is always included
+    :param label_change_rate: probability that a key's label changes in a given
+        year; some keys return to their previous label later on
+    :param first_year: first year
+    :param seed: random seed
+    """
+    rng = np.random.default_rng(seed)
+    keys = synthetic_keys(n_keys, seed=seed)
+    states = ["Bund"] + [s for s in STATES if s != "Bund"][:max(0, min(n_states, 17) - 1)]
+    years = list(range(first_year, first_year + n_years))
+
+    # label history per key, with some non-breaking spaces and trailing blanks:
+    labels = np.empty((len(keys), n_years), dtype=object)
+    for k in range(len(keys)):
+        history = [_label(rng)]
+        for y in range(n_years):
+            if y > 0 and rng.random() < label_change_rate:
+                if len(history) > 1 and rng.random() < 0.3:
+                    history.append(history[-2])
+                else:
+                    history.append(_label(rng))
+            labels[k, y] = history[-1]
+    labels = np.where(rng.random(labels.shape) < 0.05, labels + " ", labels)
+
+    year_idx, state_idx, key_idx = np.meshgrid(
+        np.arange(n_years), np.arange(len(states)), np.arange(len(keys)), indexing="ij"
+    )
+    year_idx, state_idx, key_idx = year_idx.ravel(), state_idx.ravel(), key_idx.ravel()
+
+    count = rng.lognormal(mean=3.5, sigma=2.5, size=len(key_idx)).astype("int64")
+    attempts = (count * rng.random(len(count)) * 0.2).astype("int64")
+    clearance = (count * rng.random(len(count))).astype("int64")
+    freq = count / rng.uniform(30, 800, size=len(count))
+    suspects = (count * rng.uniform(0.3, 0.9, size=len(count))).astype("int64")
+    suspects_foreign = (suspects * rng.random(len(count)) * 0.5).astype("int64")
+
+    return pd.DataFrame({
+        "year": np.array(years, dtype="int64")[year_idx],
+        "state": np.array(states, dtype=object)[state_idx],
+        "key": np.array(keys, dtype=object)[key_idx],
+        "label": labels[key_idx, year_idx],
+        "count": count,
+        "freq": freq,
+        "attempts": attempts,
+        "clearance": clearance,
+        "suspects": suspects,
+        "suspects_foreign": suspects_foreign,
+    })
+
+
+def write_workbooks(data: pd.DataFrame, dirpath) -> dict:
+    """
+    Write a frame as returned by synthetic_frame() as one Excel file per year
+    (dirpath/PKS{year}.xlsx), laid out like the BKA tables.
+
+    :return: the column selection for import_data(), like config.select_columns
+    """
+    os.makedirs(dirpath, exist_ok=True)
+    columns = {}
+
+    for year, grp in data.groupby("year"):
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet("T01_LÜ")
+        sheet.append(HEADER)
+
+        for row in grp[["key", "label", "state", "count", "freq", "attempts", "clearance",
+                        "suspects", "suspects_foreign"]].itertuples(index=False):
+            count = int(row.count)
+            sheet.append([
+                row.key, row.label, row.state, count, float(row.freq), int(row.attempts),
+                round(int(row.attempts) / count * 100, 1) if count else 0.0,
+                int(row.clearance),
+                round(int(row.clearance) / count * 100, 1) if count else 0.0,
+                int(row.suspects), int(row.suspects_foreign), None,
+            ])
+
+        workbook.save(os.path.join(dirpath, f"PKS{year}.xlsx"))
+        columns[int(year)] = list(SELECT)
+
+    return columns
+
+
+# header of a district table (per Stadt-/Landkreis), as the columns
+# import_districts selects:
+DISTRICT_HEADER = [
+    "Schlüssel", "Straftat", "Gemeindeschlüssel", "Stadt-/Landkreis", "Kreisart",
+    "erfasste Fälle", "HZ", "Versuche - Anzahl", "aufgeklärte Fälle",
+]
+DISTRICT_SELECT = [
+    "Schlüssel", "Straftat", "Gemeindeschlüssel", "Stadt-/Landkreis", "erfasste Fälle", "HZ",
+    "Versuche - Anzahl", "aufgeklärte Fälle",
+]
+
+
+def synthetic_district_frame(n_years: int = 11, n_keys: int = 1200, n_districts: int = 400,
+                             first_year: int = 2013, seed: int = 0) -> pd.DataFrame:
+    """
+    A DataFrame shaped like a district-level PKS table (year, key, label, ags,
+    district, count, freq, attempts, clearance), with every key present in
+    every year and district. Districts are spread over the 16 Länder by their
+    Gemeindeschlüssel (ags).
+
+    :param n_districts: number of districts (about 400 in the real tables)
+    """
+    rng = np.random.default_rng(seed)
+    keys = [key for key in synthetic_keys(n_keys, seed=seed) if key != "------"]
+    labels = np.array([_label(rng) for _ in keys], dtype=object)
+    ags = np.array([f"{1 + d % 16:02d}{100 + d // 16:03d}" for d in range(n_districts)],
+                   dtype=object)
+    names = np.array([f"Kreis {code}" for code in ags], dtype=object)
+
+    year_idx, district_idx, key_idx = np.meshgrid(
+        np.arange(n_years), np.arange(n_districts), np.arange(len(keys)), indexing="ij"
+    )
+    year_idx, district_idx, key_idx = year_idx.ravel(), district_idx.ravel(), key_idx.ravel()
+
+    count = rng.lognormal(mean=1.0, sigma=2.0, size=len(key_idx)).astype("int64")
+
+    return pd.DataFrame({
+        "year": first_year + year_idx,
+        "key": np.array(keys, dtype=object)[key_idx],
+        "label": labels[key_idx],
+        "ags": ags[district_idx],
+        "district": names[district_idx],
+        "count": count,
+        "freq": count / rng.uniform(0.5, 5, size=len(count)),
+        "attempts": (count * rng.random(len(count)) * 0.2).astype("int64"),
+        "clearance": (count * rng.random(len(count))).astype("int64"),
+    })
+
+
+def write_district_workbooks(data: pd.DataFrame, dirpath) -> dict:
+    """
+    Write a frame as returned by synthetic_district_frame() as one Excel file
+    per year (dirpath/PKS{year}.xlsx), with the Gemeindeschlüssel as a number,
+    as in the BKA tables.
+
+    :return: the column selection for import_districts(), like
+        config.select_district_columns
+    """
+    os.makedirs(dirpath, exist_ok=True)
+    columns = {}
+
+    for year, grp in data.groupby("year"):
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet("KR-F-01-T01")
+        sheet.append(DISTRICT_HEADER)
+
+        for row in grp[["key", "label", "ags", "district", "count", "freq", "attempts",
+                        "clearance"]].itertuples(index=False):
+            sheet.append([
+                row.key, row.label, int(row.ags), row.district, "LK", int(row.count),
+                float(row.freq), int(row.attempts), int(row.clearance),
+            ])
+
+        workbook.save(os.path.join(dirpath, f"PKS{year}.xlsx"))
+        columns[int(year)] = list(DISTRICT_SELECT)
+
+    return columns
@@ -1,6 +1,5 @@
 import colorsys
 
-import pandas as pd
 import numpy as np
 
 
@@ -12,6 +11,68 @@ def hsv_to_css(h, s, v):
     return '#%02x%02x%02x' % tuple(rgb)
 
 
+def hsv_to_css_array(h, s, v):
+    """
+    Convert arrays of HSV values into a list of css strings, in bulk.
+    Gives the same results as hsv_to_css (and so colorsys) element by element.
+    """
+    h, s, v = (np.asarray(x, dtype=float) for x in (h, s, v))
+
+    # colorsys.hsv_to_rgb, vectorized:
+    i = np.trunc(h * 6.0)
+    f = (h * 6.0) - i
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    i = i.astype(int) % 6
+
+    sector = [i == 0, i == 1, i == 2, i == 3, i == 4, i == 5]
+    r = np.select(sector, [v, q, p, p, t, v])
+    g = np.select(sector, [t, v, v, q, p, p])
+    b = np.select(sector, [p, p, t, v, v, q])
+
+    grey = s == 0.0
+    r, g, b = (np.where(grey, v, x) for x in (r, g, b))
+
+    rgb = np.stack([r, g, b], axis=-1) * 255
+    return ['#%02x%02x%02x' % tuple(c) for c in rgb.astype(int).tolist()]
+
+
+def hsvtraj_batch(sizes, ha, hb, sa=1, sb=1, va=.5, vb=.5, he=1, se=1, ve=1):
+    """
+    hsvtraj() for many trajectories at once: trajectory i has sizes[i] points
+    from ha[i] to hb[i] in hue; the other parameters are shared or given per
+    trajectory. Returns three arrays h, s, v with all trajectories one after
+    another, with the same values hsvtraj(fmt="hsv") gives for each.
+    """
+    sizes = np.asarray(sizes, dtype=int)
+    n = np.repeat(sizes, sizes)
+
+    # position of each point within its trajectory, and the trajectory's
+    # parameters:
+    starts = np.repeat(np.cumsum(sizes) - sizes, sizes)
+    position = np.arange(sizes.sum()) - starts
+    ha, hb, sa, sb, va, vb = (
+        np.repeat(np.broadcast_to(np.asarray(x, dtype=float), sizes.shape), sizes)
+        for x in (ha, hb, sa, sb, va, vb)
+    )
+
+    # make curvature (same as np.arange(0, 1+1/n, 1/(n-1)) in hsvtraj):
+    single = n == 1
+    unit_distance = position * (1 / np.where(single, 2, n - 1))
+
+    curve_h = (ha + (hb - ha) * unit_distance ** he) % 1
+    curve_s = sa + (sb - sa) * unit_distance ** se
+    curve_v = va + (vb - va) * unit_distance ** ve
+
+    # special case n=1 (the midpoint, hue not made cyclical):
+    curve_h = np.where(single, (ha + hb) / 2, curve_h)
+    curve_s = np.where(single, (sa + sb) / 2, curve_s)
+    curve_v = np.where(single, (va + vb) / 2, curve_v)
+
+    return curve_h, curve_s, curve_v
+
+
 def hsvtraj(n, ha=0, hb=1, sa=1, sb=1, va=.5, vb=.5, he=1, se=1, ve=1, fmt="hsv"):
     """
     return a list of colorstrings in hsv, rgb or hex format defined by
@@ -53,20 +114,3 @@ def hsvtraj(n, ha=0, hb=1, sa=1, sb=1, va=.5, vb=.5, he=1, se=1, ve=1, fmt="hsv"
             hex_out.append(hsv_to_css(h,s,v))
         return hex_out
 
-
-def max_nchildren(df, parent_col="parent"):
-    """
-    For a df with hierarchical categories that denote their parent using the "parent" column,
-    return the maximum number of children a category has.
-    
-    :param df: the dataframe
-    :param parent_col: name of the column that denotes the parent
-    """
-    max_nchildren = 0
-    for key, grp in df.groupby(parent_col):
-        if len(grp) > max_nchildren:
-            max_nchildren = len(grp)
-    
-    return max_nchildren
-
-
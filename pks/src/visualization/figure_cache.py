@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import plotly.io as pio
+
+
+class FigureCache:
+    """
+    Cache of rendered figures, keyed on the figure's name, the normalized
+    selection it shows and the version of the dataset it was built from (see
+    dataset.read_version), so that a new dataset never gets an old figure.
+
+    Figures are held as plotly JSON in a least-recently-used cache in memory,
+    bounded by the size of the JSON in bytes. With db_path, they are also
+    stored in an SQLite file that all server workers on a host share (bounded
+    the same way, evicting the least recently used). Hits are returned as
+    figure dicts, as dcc.Graph takes them.
+
+    :param version: version of the dataset the figures are built from
+    :param max_bytes: size bound of the memory tier
+    :param db_path: SQLite file of the shared tier (None: memory only)
+    :param max_db_bytes: size bound of the shared tier
+    """
+
+    def __init__(self, version: str, max_bytes: int = 64 * 2**20, db_path=None,
+                 max_db_bytes: int = 512 * 2**20):
+        self.version = version
+        self.max_bytes = max_bytes
+        self.db_path = db_path
+        self.max_db_bytes = max_db_bytes
+
+        self._figures = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counts = dict(hits=0, db_hits=0, misses=0, evictions=0, db_evictions=0)
+
+        if db_path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            with self._connect() as db:
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("CREATE TABLE IF NOT EXISTS figures "
+                           "(key TEXT PRIMARY KEY, figure TEXT, bytes INTEGER, used REAL)")
+
+    def _key(self, name: str, selection) -> str:
+        return json.dumps([self.version, name, selection], sort_keys=True, ensure_ascii=False)
+
+    @contextmanager
+    def _connect(self):
+        # one connection per operation, as workers may fork after the cache was
+        # created:
+        db = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _remember(self, key: str, figure: str) -> None:
+        size = len(figure.encode())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._figures:
+                self._bytes -= self._figures.pop(key)[1]
+            self._figures[key] = (figure, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._figures.popitem(last=False)
+                self._bytes -= evicted
+                self._counts["evictions"] += 1
+
+    def _recall(self, key: str) -> str:
+        with self._lock:
+            if key not in self._figures:
+                return None
+            self._figures.move_to_end(key)
+            return self._figures[key][0]
+
+    def _db_recall(self, key: str) -> str:
+        with self._connect() as db:
+            row = db.execute("SELECT figure FROM figures WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                db.execute("UPDATE figures SET used = ? WHERE key = ?", (time.time(), key))
+        return row[0] if row is not None else None
+
+    def _db_store(self, key: str, figure: str) -> None:
+        size = len(figure.encode())
+        if size > self.max_db_bytes:
+            return
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO figures VALUES (?, ?, ?, ?)",
+                       (key, figure, size, time.time()))
+            total = db.execute("SELECT COALESCE(SUM(bytes), 0) FROM figures").fetchone()[0]
+            # evict the least recently used figures until the tier fits its
+            # bound again:
+            for old_key, old_size in db.execute("SELECT key, bytes FROM figures ORDER BY used").fetchall():
+                if total <= self.max_db_bytes:
+                    break
+                db.execute("DELETE FROM figures WHERE key = ?", (old_key,))
+                total -= old_size
+                with self._lock:
+                    self._counts["db_evictions"] += 1
+
+    def get(self, name: str, selection, build):
+        """
+        The figure of name for selection, from the cache or built with build()
+        and cached.
+
+        :param name: name of the figure (e.g. the callback's output)
+        :param selection: what the figure shows, normalized (e.g. a sorted key
+            list); must be JSON-serializable
+        :param build: function without arguments that returns the figure
+        """
+        key = self._key(name, selection)
+
+        figure = self._recall(key)
+        if figure is not None:
+            with self._lock:
+                self._counts["hits"] += 1
+            return json.loads(figure)
+
+        if self.db_path is not None:
+            try:
+                figure = self._db_recall(key)
+            except sqlite3.Error as error:
+                logging.warning(f"Figure cache {self.db_path} not readable: {error}")
+            if figure is not None:
+                with self._lock:
+                    self._counts["db_hits"] += 1
+                self._remember(key, figure)
+                return json.loads(figure)
+
+        with self._lock:
+            self._counts["misses"] += 1
+
+        figure = pio.to_json(build(), validate=False)
+        self._remember(key, figure)
+        if self.db_path is not None:
+            try:
+                self._db_store(key, figure)
+            except sqlite3.Error as error:
+                logging.warning(f"Figure cache {self.db_path} not writable: {error}")
+
+        return json.loads(figure)
+
+    def stats(self) -> dict:
+        """
+        Hit, miss and eviction counters of this process, and the size of the
+        memory tier.
+        """
+        with self._lock:
+            return dict(
+                version=self.version,
+                **self._counts,
+                entries=len(self._figures),
+                bytes=self._bytes,
+                max_bytes=self.max_bytes,
+                db_path=None if self.db_path is None else str(self.db_path),
+            )
@@ -1,6 +1,9 @@
 import re
 import colorsys
+from functools import lru_cache
 from textwrap import wrap
+from types import MappingProxyType
+from typing import NamedTuple
 import logging
 
 import pandas as pd
@@ -9,7 +12,8 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
-from ...src.visualization.colormap import hsv_to_css, hsvtraj, max_nchildren
+from ...src.data.hierarchy import build_hierarchy
+from ...src.visualization.colormap import hsv_to_css_array, hsvtraj_batch
 
 
 logging.basicConfig(
@@ -97,6 +101,16 @@ def num(number: float, separator: str = ".", magnitude: str = None, digits: int
     return outstring
 
 
+@lru_cache(maxsize=None)
+def wrap_label(text: str, width: int) -> str:
+    """
+    Break a label into lines of at most width characters, joined by <br> for
+    plotly. Memoized: labels repeat across years and states, so each distinct
+    one is wrapped once.
+    """
+    return "<br>".join(wrap(text, width))
+
+
 def _css_rainbow(N=5, s=1, v=0.75):
     """
     Helper that gives N samples from the rainbow.
@@ -192,6 +206,10 @@ def make_df_colormap(df):
     - children of a parent key are spread over a gamut around the parent's hue
     - width of gamut and some other parameters can be set here
 
+    Colors are assigned generation by generation, going down the key hierarchy
+    from the root; each generation's trajectories are computed together in one
+    batch.
+
     :param df: the dataset
     """
     MAX_GAMUT = 0.75  # how wide the child spectrum may become under the parent with most children
@@ -202,70 +220,62 @@ def make_df_colormap(df):
     # 1 is linear
     GAMUT_EXP = 1
 
-    df = df.copy().drop_duplicates(subset="key")
-
-    df["h"] = None
-    df["s"] = None
-    df["v"] = None
+    df = df.drop_duplicates(subset="key")
+    tree = build_hierarchy(df.key, df.parent)
+    nchildren = tree.nchildren
 
     # an index that for every family size returns a reasonable gamut width among children:
-    gam_unit = list(
-        np.arange(0, (1 + 1 / max_nchildren(df)), 1 / (max_nchildren(df) - 1))
-    )
-    gam_curvature = [i**GAMUT_EXP for i in gam_unit]
-    gam_curve = [MIN_GAMUT + (MAX_GAMUT - MIN_GAMUT) * i for i in gam_curvature]
-
-    # set lvl 1:
-    n1 = len(df.loc[df.level.eq(1)])
-    colors_1 = hsvtraj(n1, sa=1, sb=0.7, va=0.5, vb=0.7)
-    df.loc[df.level.eq(1), "h"] = [i[0] for i in colors_1]
-    df.loc[df.level.eq(1), "s"] = [i[1] for i in colors_1]
-    df.loc[df.level.eq(1), "v"] = [i[2] for i in colors_1]
-
-    # set lvl >1 recursively:
-    for lv_parent, grp in df.loc[df.level.gt(1)].groupby(
-        ["level", "parent"], sort=True
-    ):
-        parent_row = df.loc[df.key.eq(lv_parent[1])]
-        parent_hue = parent_row["h"].iloc[0]
-
-        nchildren = len(grp)
-
-        gamut = gam_curve[nchildren - 1]
-
-        if lv_parent[1] == "622000":
-            logging.debug(f"n={nchildren}; parent_hue={parent_hue}; gamut={gamut}")
-
-        childrens_hsv = hsvtraj(
-            n=nchildren,
-            ha=parent_hue - 0.5 * gamut,
-            hb=parent_hue + 0.5 * gamut,
-            sa=0.6,
-            sb=1,
-            va=1,
-            vb=0.6,
-        )
+    max_nchildren = nchildren.max()
+    gam_unit = np.arange(0, (1 + 1 / max_nchildren), 1 / (max_nchildren - 1))
+    gam_curve = MIN_GAMUT + (MAX_GAMUT - MIN_GAMUT) * gam_unit**GAMUT_EXP
 
-        df.loc[((df.level.eq(lv_parent[0])) & (df.parent.eq(lv_parent[1]))), "h"] = [
-            i[0] for i in childrens_hsv
-        ]
-        df.loc[((df.level.eq(lv_parent[0])) & (df.parent.eq(lv_parent[1]))), "s"] = [
-            i[1] for i in childrens_hsv
-        ]
-        df.loc[((df.level.eq(lv_parent[0])) & (df.parent.eq(lv_parent[1]))), "v"] = [
-            i[2] for i in childrens_hsv
-        ]
-
-    df.loc[df.level.gt(0), "color"] = df.loc[df.level.gt(0)].apply(
-        lambda x: hsv_to_css(x.h, x.s, x.v), axis=1
-    )
-    df = df.drop(["h", "s", "v"], axis=1)
+    generations = tree.generations()
+    hues = np.zeros(len(tree))
+    colormap = {key: np.nan for key in tree.keys[generations[0]]}
 
-    return df[["key", "color"]].set_index("key").to_dict()["color"]
+    for level, generation in enumerate(generations[1:], start=1):
+        if level == 1:
+            h, s, v = hsvtraj_batch([len(generation)], ha=0, hb=1, sa=1, sb=0.7, va=0.5, vb=0.7)
+
+        else:
+            # spread each family around its parent's hue:
+            parents = generations[level - 1]
+            parents = parents[nchildren[parents] > 0]
+            sizes = nchildren[parents]
+            gamuts = gam_curve[sizes - 1]
+
+            h, s, v = hsvtraj_batch(
+                sizes,
+                ha=hues[parents] - 0.5 * gamuts,
+                hb=hues[parents] + 0.5 * gamuts,
+                sa=0.6,
+                sb=1,
+                va=1,
+                vb=0.6,
+            )
+
+        hues[generation] = h
+        colormap.update(zip(tree.keys[generation], hsv_to_css_array(h, s, v)))
+
+    return colormap
+
+
+def get_catalog(df):
+    """
+    One row per key with its label, parent and sectionwidth, plus label_key
+    ("label (key)") for the text search.
+
+    :param df: the hierarchized federal frame
+    """
+    catalog = df[["key", "label", "parent", "sectionwidth"]].drop_duplicates(subset="key")
+    catalog.label = catalog.label.str.replace("<br>", " ")
+    catalog["label_key"] = catalog.label + " (" + catalog.key + ")"
+    return catalog
 
 
 def color_map_from_color_column(df):
-    return {k: grp.color.iloc[0] for k, grp in df.groupby("key")}
+    first = df.drop_duplicates(subset="key")
+    return dict(zip(first.key.astype(object), first.color.astype(object)))
 
 
 def sunburst_location(input_json: str):
@@ -309,14 +319,23 @@ def sunburst_location(input_json: str):
     return location
 
 
-def get_sunburst(df, colormap):
+def get_sunburst(df, colormap, hierarchy=None):
+    """
+    :param df: one row per key, with the columns key, parent, label and
+        sectionwidth
+    :param colormap: dict key -> color
+    :param hierarchy: the key hierarchy (see data.hierarchy); built from df if
+        not given
+    """
+    if hierarchy is None:
+        hierarchy = build_hierarchy(df.key, df.parent)
 
     # count children of each key for information in the plot:
-    key_children_dict = df.groupby("parent").agg(len).key.to_dict()
-    df["nchildren"] = df.key.apply(lambda k: key_children_dict.get(k, 0))
+    positions = hierarchy.positions(df.key)
+    df["nchildren"] = np.where(positions >= 0, hierarchy.nchildren[positions], 0)
 
     # wrap long labels in hover data:
-    df.label = df.apply(lambda x: "<br>".join(wrap(x.label, 80)), axis=1)
+    df.label = df.label.map(lambda label: wrap_label(label, 80))
 
     # change display name of root node:
     df.loc[df.key.eq("------"), "key"] = "Straftaten"
@@ -360,80 +379,109 @@ def get_sunburst(df, colormap):
     return fig
 
 
-def get_presence_chart(
+class PresenceSeries(NamedTuple):
+    """
+    What the presence chart shows of one key, prepared once by
+    presence_lookup(). The arrays are read-only, one entry per year the key is
+    reported in.
+    """
+    years: np.ndarray
+    keys: np.ndarray
+    customdata: np.ndarray  # wrapped label and formatted count, for hover
+    new_years: np.ndarray  # years in which the key got a new label
+    firstlabel: str  # short label of the first year
+    color: str
+
+
+def _frozen(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+
+def presence_lookup(
     df,
-    keys,
     colormap,
     xaxis="year",
-    yaxis="key",
     label_annot="shortlabel",
     label_hover="label",
     newname="label_change",
 ):
     """
-    Returns an existence chart indicating a set of keys and their existence through the years.
+    The series of all keys for get_presence_chart(), as a read-only mapping key
+    -> PresenceSeries.
 
-    :param df: PKS dataframe
-    :param keys: list of keys that have been selected for display
+    :param df: PKS dataframe of one state (e.g. the federal frame), one row per
+        key and year
+    :param colormap: dict key -> color
     :param xaxis: name of the years attribute
-    :param yaxis: name of the key attribute
-    :param labels: name of the label attribute, to be displayed within the plot
+    :param label_annot: name of the label attribute, to be displayed within the
+        plot
+    :param label_hover: name of the label attribute, to be displayed on hover
     :param newname: name of the boolean attribute that signals if the current entry corresponds
         to a change in the label of the same key, compared to the previous year
     """
-    df = df.loc[df.key.isin(keys)].copy()
-
-    df["firstlabel"] = df[label_annot]
+    df = df.assign(key=df.key.astype(str)).sort_values(["key", xaxis])
 
-    df2 = pd.DataFrame()
-
-    for i, grp in df.groupby([yaxis, "state"]):
-        this_group = grp.sort_values(xaxis)
-
-        firstlabel_list = this_group["firstlabel"].values
-        firstlabel_list[1:] = ""
-        this_group["firstlabel"] = firstlabel_list
-
-        df2 = pd.concat([df2, this_group])
+    keys = df.key.to_numpy()
+    years = df[xaxis].to_numpy()
+    new = df[newname].to_numpy(dtype=bool)
+    firstlabels = df[label_annot].astype(object).to_numpy()
+    # for hover, break long labels:
+    customdata = np.stack(
+        (df[label_hover].map(lambda label: wrap_label(label, 60)).astype(object).to_numpy(),
+         df["count"].map(germanize_number).to_numpy(dtype=object)),
+        axis=-1,
+    )
 
-    df = df2.copy()
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=int)
+    stops = np.r_[starts[1:], len(keys)]
+
+    return MappingProxyType({
+        keys[start]: PresenceSeries(
+            years=_frozen(years[start:stop]),
+            keys=_frozen(keys[start:stop]),
+            customdata=_frozen(customdata[start:stop]),
+            new_years=_frozen(years[start:stop][new[start:stop]]),
+            firstlabel=firstlabels[start],
+            color=colormap[keys[start]],
+        )
+        for start, stop in zip(starts, stops)
+    })
 
-    # categorical y-axis:
-    df.key = df.key.astype("str")
 
-    # ensure right order of dots:
-    df = df.sort_values(["key", "year"])
+def get_presence_chart(lookup, keys):
+    """
+    Returns an existence chart indicating a set of keys and their existence
+    through the years. Only the series of the given keys are touched, so its
+    cost does not depend on the size of the dataset.
 
-    # for hover, break long labels:
-    df["hoverlabel"] = df[label_hover].apply(lambda x: "<br>".join(wrap(x, width=60)))
+    :param lookup: series of all keys, see presence_lookup()
+    :param keys: list of keys that have been selected for display
+    """
+    # categorical y-axis, keys in ascending order:
+    series = [(key, lookup[key]) for key in sorted(set(map(str, keys))) if key in lookup]
 
     fig = go.Figure()
 
     # add each key's line and points:
-    for i, grp in df.groupby(yaxis):
+    for key, ser in series:
         fig.add_trace(
             go.Scatter(
-                x=grp[xaxis],
-                y=grp[yaxis],
-                # text=grp["firstlabel"],
+                x=ser.years,
+                y=ser.keys,
                 mode="lines+markers",
-                marker=dict(color=colormap[i], size=12),
+                marker=dict(color=ser.color, size=12),
                 line_width=4,
-                # textposition="top right",
-                customdata=np.stack(
-                    (grp["hoverlabel"], grp["count"].apply(germanize_number)), axis=-1
-                ),
+                customdata=ser.customdata,
                 hovertemplate="<b>%{customdata[0]}</b> (%{x}):<br><br>%{customdata[1]} Fälle<extra></extra>",
             )
         )
 
     # add markers for each time a new label is used (black circles):
-    new_markers = df.loc[df[newname]]
-
     fig.add_trace(
         go.Scatter(
-            x=new_markers[xaxis],
-            y=new_markers[yaxis],
+            x=np.concatenate([ser.new_years for _, ser in series]) if series else [],
+            y=np.concatenate([np.full(len(ser.new_years), key, dtype=object) for key, ser in series]) if series else [],
             mode="markers",
             marker=dict(
                 color="rgba(255,255,255,.7)",
@@ -448,17 +496,15 @@ def get_presence_chart(
 
     # annotation
     # for annotations, fix x position to leftmost year:
-    annot_x = df.year.min()
-
-    for i, grp in df.groupby(yaxis):
-        annot = grp.iloc[0]
+    annot_x = min((ser.years[0] for _, ser in series), default=None)
 
+    for key, ser in series:
         fig.add_trace(
             go.Scatter(
                 x=[annot_x],
-                y=[annot[yaxis]],
+                y=[key],
                 mode="text",
-                text=annot["firstlabel"],
+                text=ser.firstlabel,
                 textposition="top right",
                 textfont=dict(size=18),
             )
@@ -486,7 +532,9 @@ def get_presence_chart(
 
 def get_ts_clearance(df):
     """
-    :param df: Dataframe containing 1..n keys (only the data to be displayed - filter beforehand!)
+    :param df: Dataframe containing 1..n keys (only the data to be displayed -
+        filter beforehand!), one row per key and year, with the precomputed
+        columns unsolved and clearance_rate
     """
     # colormap = {i: grp.loc[grp.index[0], "color"] for i, grp in df.groupby("key")}
     colormap = color_map_from_color_column(df)
@@ -516,19 +564,16 @@ def get_ts_clearance(df):
         year_grp = df.loc[df.year.eq(year)]
 
         # iterate through keys (within year):
-        for j, key_grp in year_grp.groupby("key"):
-
-            committed = key_grp.loc[key_grp.variable.eq("clearance")]
-            unsolved = key_grp.loc[key_grp.variable.eq("unsolved")]
+        for j, key_grp in year_grp.groupby("key", observed=True):
 
             customdata = np.stack(
                 (
-                    committed["key"],
-                    committed["year"],
-                    committed["label"],
-                    unsolved["value"].apply(germanize_number),
-                    committed["clearance_rate"],
-                    committed["count"].apply(germanize_number),
+                    key_grp["key"],
+                    key_grp["year"],
+                    key_grp["label"],
+                    key_grp["unsolved"].apply(germanize_number),
+                    key_grp["clearance_rate"],
+                    key_grp["count"].apply(germanize_number),
                 ),
                 axis=-1,
             )
@@ -556,11 +601,11 @@ def get_ts_clearance(df):
             fig.add_trace(
                 go.Bar(
                     x=[j],
-                    y=committed["value"],
+                    y=key_grp["clearance"],
                     marker=dict(color=colormap[j]),
                     showlegend=(j in legend_todo),
                     legendgroup=j,
-                    name=committed.shortlabel.iloc[0],
+                    name=key_grp.shortlabel.iloc[0],
                     customdata=customdata,
                     hovertemplate=hovertemplate_committed,
                 ),
@@ -572,7 +617,7 @@ def get_ts_clearance(df):
             fig.add_trace(
                 go.Bar(
                     x=[j],
-                    y=unsolved.value,
+                    y=key_grp["unsolved"],
                     marker=dict(color=_desaturate_brighten(colormap[j], 0.25, 0.5)),
                     showlegend=False,
                     legendgroup=j,
@@ -649,7 +694,14 @@ def empty_ts_clearance(years):
     return fig
 
 
-def get_ts_states(df):
+def get_ts_states(df, key_stats=None):
+    """
+    :param df: Dataframe containing 1..n keys for all states
+    :param key_stats: DataFrame indexed by key with the columns freq_min and
+        freq_max (see dataset.read_keys); computed from df if not given
+    """
+    if key_stats is None:
+        key_stats = df.groupby("key", observed=True).freq.agg(freq_min="min", freq_max="max")
 
     key_colormap = color_map_from_color_column(df)
 
@@ -702,8 +754,9 @@ def get_ts_states(df):
     for row, key in enumerate(df.key.unique(), start=1):
 
         df_key = df.loc[df.key.eq(key)]
+        freq_min, freq_max = key_stats.loc[key, ["freq_min", "freq_max"]]
 
-        for state, grp in df_key.groupby("state"):
+        for state, grp in df_key.groupby("state", observed=True):
 
             customdata = grp.freq.apply(num, digits=1)
 
@@ -757,8 +810,8 @@ def get_ts_states(df):
                 type="rect",
                 yref=yref,
                 xref="paper",
-                y0=min(df_key.freq),
-                y1=max(df_key.freq),
+                y0=freq_min,
+                y1=freq_max,
                 x0=-0.001,
                 x1=1,
                 fillcolor=_desaturate_brighten(key_colormap[key], 0.7, 0.8),
@@ -772,8 +825,8 @@ def get_ts_states(df):
                 type="rect",
                 xref="paper",
                 yref=yref,
-                y0=min(df_key.freq),
-                y1=max(df_key.freq),
+                y0=freq_min,
+                y1=freq_max,
                 x0=-0.005,
                 x1=0.0,
                 fillcolor=key_colormap[key],
@@ -792,7 +845,7 @@ def get_ts_states(df):
         fig.update_layout(
             {
                 f"yaxis{row if row > 1 else ''}": {
-                    "range": [df_key.freq.min(), df_key.freq.max()]
+                    "range": [freq_min, freq_max]
                 }
             }
         )